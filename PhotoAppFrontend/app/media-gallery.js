@@ -727,7 +727,7 @@ export default function MediaGalleryScreen() {
                 showsVerticalScrollIndicator={false}
             >
                <TouchableWithoutFeedback onPress={toggleControls}>
-                  <Image source={{ uri: item.url }} style={mediaStyles.fullImage} />
+                  <Image source={{ uri: item.preview || item.url }} style={mediaStyles.fullImage} />
                </TouchableWithoutFeedback>
             </ScrollView>
           )}
@@ -94,9 +94,11 @@ export default function ProfileScreen() {
             }
             
             // Calculate Remaining
-            // Demo limits: 10 photos, 2 videos
-            setRemainingPhotos(Math.max(0, 10 - usedPhotos));
-            setRemainingVideos(Math.max(0, 2 - usedVideos));
+            // Limits come from the user's plan (demo: 10 photos, 2 videos)
+            const photoLimit = data.photo_limit ?? 10;
+            const videoLimit = data.video_limit ?? 2;
+            setRemainingPhotos(Math.max(0, photoLimit - usedPhotos));
+            setRemainingVideos(Math.max(0, videoLimit - usedVideos));
             // ----------------------------------------------------
 
             if (data.thumbnail_url) {
@@ -1,10 +1,18 @@
 import os
-from flask import Flask
+from flask import Flask, jsonify, Response, request
 from flask_cors import CORS
+import db
+import jobs
+import storage
+import authz
+import metrics
+from querylog import query_log
 from routes.auth import auth_bp
 from routes.groups import groups_bp
 from routes.photos import photos_bp
 from routes.admin import admin_bp   # <--- ADDED IMPORT
+from routes.uploads import uploads_bp
+from routes.exports import exports_bp
 
 app = Flask(__name__)
 CORS(app) # Allow mobile app connection
@@ -21,6 +29,15 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Let Apache/lighttpd stream media files (MEDIA_SENDFILE=x-sendfile), see media.py
+app.config['USE_X_SENDFILE'] = os.getenv('MEDIA_SENDFILE', '').lower() == 'x-sendfile'
+
+# Return request-scoped DB connections to the pool after every request
+db.init_app(app)
+
+# Per-route latency / status / DB time instrumentation, scraped at /metrics
+metrics.init_app(app)
+
 # =====================================================
 # REGISTER BLUEPRINTS
 # =====================================================
@@ -29,11 +46,55 @@ app.register_blueprint(auth_bp)
 app.register_blueprint(groups_bp)
 app.register_blueprint(photos_bp)
 app.register_blueprint(admin_bp)
+app.register_blueprint(uploads_bp)
+app.register_blueprint(exports_bp)
 
 @app.route('/')
 def index():
     return "Backend is running! Auth, Groups, Photos and Admin are ready."
 
+# Connection pool stats for monitoring (in use, waits, wait time...)
+@app.route('/db-pool-stats')
+def db_pool_stats():
+    return jsonify(db.get_pool_stats())
+
+# Prometheus scrape endpoint
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Per-statement DB stats (count, total/avg/max time, routes) and recent slow queries with EXPLAIN plans.
+# ?sort=total_ms|count|avg_ms|max_ms|slow&limit=50; DELETE ?admin_id= (super admin) resets.
+@app.route('/db-query-stats', methods=['GET', 'DELETE'])
+def db_query_stats():
+    if request.method == 'DELETE':
+        try:
+            conn = db.get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+            allowed = authz.is_super_admin(cursor, request.args.get('admin_id'))
+            cursor.close(); conn.close()
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        if not allowed:
+            return jsonify({"error": "Unauthorized"}), 403
+        query_log.reset()
+        return jsonify({"message": "Query stats reset"}), 200
+    sort = request.args.get('sort', 'total_ms')
+    if sort not in ('total_ms', 'count', 'avg_ms', 'max_ms', 'slow'):
+        return jsonify({"error": "Invalid sort"}), 400
+    return jsonify(query_log.snapshot(sort, request.args.get('limit', 50, type=int)))
+
+# Membership / super-admin cache stats (hit rate, size, invalidations)
+@app.route('/authz-cache-stats')
+def authz_cache_stats():
+    return jsonify(authz.cache_stats())
+
 if __name__ == '__main__':
+    # Background media worker (thumbnails) and file collector. With the reloader only the child
+    # process runs them. In production run `python jobs.py` next to the WSGI server instead.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' and os.getenv('MEDIA_WORKER_ENABLED', '1') == '1':
+        jobs.start_worker(UPLOAD_FOLDER)
+        storage.start_collector(UPLOAD_FOLDER)
+
     # Run the server accessible to the network
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,186 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import metrics
+
+# =====================================================
+# MEMBERSHIP / ADMIN CACHE
+# =====================================================
+# (user, group) -> membership row and user -> is_super_admin, kept in-process
+# (LRU + TTL). Every route that changes them calls the matching invalidate_*
+# AFTER its commit. Invalidation is per process: other workers see a change
+# once their entry expires, so AUTHZ_CACHE_TTL bounds the staleness.
+
+AUTHZ_CACHE_SIZE = int(os.getenv('AUTHZ_CACHE_SIZE', 10000))
+AUTHZ_CACHE_TTL = float(os.getenv('AUTHZ_CACHE_TTL', 30))
+
+
+class TTLCache:
+    """
+    LRU + TTL. With max_bytes, entries are also weighed with sizeof(value) and the
+    least recently used are evicted until their total fits (for caching bodies).
+    """
+
+    def __init__(self, maxsize=AUTHZ_CACHE_SIZE, ttl=AUTHZ_CACHE_TTL, max_bytes=None, sizeof=len):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self._data = OrderedDict()  # key -> (expires_at, value, size), least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Bumped by every invalidation. A value read from the DB before an invalidation
+        # (i.e. possibly before the change was committed) must not be stored after it.
+        self.generation = 0
+
+    def get(self, key):
+        """Returns (found, value)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            size = self.sizeof(value) if self.max_bytes is not None else 0
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._remove(key)
+            self._data[key] = (time.monotonic() + self.ttl, value, size)
+            self.bytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+        return entry
+
+    def invalidate(self, key):
+        with self._lock:
+            self.generation += 1
+            if self._remove(key) is not None:
+                self.invalidations += 1
+
+    def invalidate_where(self, predicate):
+        """Drops every key for which predicate(key) is true (e.g. all entries of a group)."""
+        with self._lock:
+            self.generation += 1
+            for key in [k for k in self._data if predicate(k)]:
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.maxsize,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+
+membership_cache = TTLCache()
+super_admin_cache = TTLCache()
+
+def _id(value):
+    # IDs arrive as str from query strings and as int from JSON bodies
+    return str(value)
+
+def _column(row, name):
+    # Routes use both dictionary and tuple cursors
+    return row[name] if isinstance(row, dict) else row[0]
+
+def get_membership(cursor, user_id, group_id):
+    """None if the user isn't in the group, else {"is_admin": bool}. Non-membership is cached too."""
+    key = (_id(user_id), _id(group_id))
+    found, value = membership_cache.get(key)
+    if found:
+        return value
+
+    generation = membership_cache.generation
+    cursor.execute("SELECT is_admin FROM groups_members WHERE user_id = %s AND group_id = %s", (user_id, group_id))
+    row = cursor.fetchone()
+    value = {"is_admin": _column(row, 'is_admin') == 1} if row else None
+    membership_cache.set(key, value, generation)
+    return value
+
+def is_member(cursor, user_id, group_id):
+    return get_membership(cursor, user_id, group_id) is not None
+
+def is_group_admin(cursor, user_id, group_id):
+    membership = get_membership(cursor, user_id, group_id)
+    return bool(membership and membership['is_admin'])
+
+def is_super_admin(cursor, user_id):
+    key = _id(user_id)
+    found, value = super_admin_cache.get(key)
+    if found:
+        return value
+
+    generation = super_admin_cache.generation
+    cursor.execute("SELECT is_super_admin FROM users WHERE id = %s", (user_id,))
+    row = cursor.fetchone()
+    value = bool(row) and _column(row, 'is_super_admin') == 1
+    super_admin_cache.set(key, value, generation)
+    return value
+
+# ==========================================
+# INVALIDATION (call after commit)
+# ==========================================
+def invalidate_membership(user_id, group_id):
+    """Join, kick, leave, promote/demote."""
+    membership_cache.invalidate((_id(user_id), _id(group_id)))
+
+def invalidate_group(group_id):
+    """Group deleted: every cached membership of it."""
+    group_id = _id(group_id)
+    membership_cache.invalidate_where(lambda key: key[1] == group_id)
+
+def invalidate_user(user_id):
+    """User deleted or banned: all their memberships and their super-admin flag."""
+    user_id = _id(user_id)
+    membership_cache.invalidate_where(lambda key: key[0] == user_id)
+    super_admin_cache.invalidate(user_id)
+
+def cache_stats():
+    return {"membership": membership_cache.stats(), "super_admin": super_admin_cache.stats()}
+
+def _cache_metrics():
+    stats = cache_stats()
+    return [
+        ("authz_cache_lookups_total", "counter", "Membership / super-admin cache lookups.",
+         [({"cache": name, "result": result}, s[key]) for name, s in stats.items()
+          for result, key in (("hit", "hits"), ("miss", "misses"))]),
+        ("authz_cache_entries", "gauge", "Entries currently cached.", [({"cache": name}, s["size"]) for name, s in stats.items()])
+    ]
+
+metrics.register_collector(_cache_metrics)
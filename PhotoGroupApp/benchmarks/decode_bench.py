@@ -0,0 +1,110 @@
+"""
+Compares full-resolution and draft-mode decoding of large phone photos, without a database.
+
+    python benchmarks/decode_bench.py [--megapixels 48] [--images 5] [--size thumb]
+
+Writes synthetic EXIF-rotated JPEGs (and one PNG) of the given size to a temp
+directory, then renders each one to a rendition in a fresh process per method:
+
+    full   the old path: Image.open, exif_transpose of the whole bitmap, then thumbnail
+    draft  media.open_image with the rendition box (draft/reduce before rotation)
+
+and reports the time per image and the peak RSS growth of that process.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import Image, ImageDraw, ImageOps
+from media import open_image, save_rendition, RENDITIONS
+
+def peak_rss_mb():
+    # VmHWM rather than ru_maxrss: Linux carries ru_maxrss over from the parent across exec
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024   # KiB on Linux, bytes on macOS
+
+def make_images(folder, megapixels, count):
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+    paths = []
+    for i in range(count):
+        img = Image.new('RGB', (width, height), (30 * i % 255, 120, 200))
+        draw = ImageDraw.Draw(img)
+        for j in range(0, width, max(1, width // 40)):
+            draw.line((j, 0, width - j, height), fill=(j % 255, 80, 160), width=8)
+        exif = Image.Exif()
+        exif[0x0112] = 6   # Orientation: rotate 90° CW, as portrait phone shots are stored
+        path = os.path.join(folder, f"photo_{i}.jpg")
+        img.save(path, 'JPEG', quality=90, exif=exif)
+        paths.append(path)
+    png = os.path.join(folder, "screenshot.png")
+    Image.open(paths[0]).save(png)
+    return paths + [png]
+
+def render_full(path, box, dest):
+    img = Image.open(path)
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    save_rendition(img, box, 'JPEG', dest)
+
+def render_draft(path, box, dest):
+    save_rendition(open_image(path, box), box, 'JPEG', dest)
+
+METHODS = {'full': render_full, 'draft': render_draft}
+
+def worker(method, box, paths):
+    baseline = peak_rss_mb()
+    results = []
+    for path in paths:
+        started = time.perf_counter()
+        METHODS[method](path, box, path + f".{method}.jpg")
+        results.append({"file": os.path.basename(path), "ms": (time.perf_counter() - started) * 1000})
+    print(json.dumps({"peak_mb": peak_rss_mb() - baseline, "results": results}))
+
+def run(method, size, paths):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', method, '--size', size, *paths],
+                         check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--megapixels', type=float, default=48)
+    parser.add_argument('--images', type=int, default=5)
+    parser.add_argument('--size', default='thumb', choices=sorted(RENDITIONS))
+    parser.add_argument('--worker', choices=sorted(METHODS), help=argparse.SUPPRESS)
+    parser.add_argument('paths', nargs='*', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, RENDITIONS[args.size], args.paths)
+        return
+
+    folder = tempfile.mkdtemp(prefix='decode_bench_')
+    try:
+        paths = make_images(folder, args.megapixels, args.images)
+        jpegs = [p for p in paths if p.endswith('.jpg')]
+        print(f"{len(jpegs)} JPEGs of {args.megapixels:g} MP + 1 PNG, rendered to '{args.size}' {RENDITIONS[args.size]}")
+        for label, subset in (("JPEG", jpegs), ("PNG", [paths[-1]])):
+            for method in METHODS:
+                stats = run(method, args.size, subset)
+                times = [r['ms'] for r in stats['results']]
+                print(f"  {label:<5}{method:<6} {sum(times) / len(times):8.1f} ms/image   peak RSS +{stats['peak_mb']:.0f} MB")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Measures the near-duplicate index and the perceptual hash, without a database.
+
+    python benchmarks/duplicate_bench.py [--photos 100000] [--queries 2000] [--radius 8]
+
+1. Builds a HammingIndex of random 64-bit hashes and times lookups against it
+   (half of them near copies of an indexed hash), compared with a linear scan.
+2. Hashes a synthetic photo and edited copies of it (JPEG recompression, resize,
+   brightness, crop) and prints the Hamming distance of each to the original.
+"""
+import io
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import Image, ImageDraw, ImageEnhance
+from duplicates import HammingIndex
+from media import perceptual_hash
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))]
+
+def flip_bits(value, n, rng):
+    for bit in rng.sample(range(64), n):
+        value ^= 1 << bit
+    return value
+
+def bench_index(photos, queries, radius, rng):
+    hashes = [rng.getrandbits(64) for _ in range(photos)]
+    started = time.perf_counter()
+    index = HammingIndex()
+    for photo_id, value in enumerate(hashes, 1):
+        index.add(photo_id, value)
+    build = time.perf_counter() - started
+
+    # Half the queries are near copies of an indexed photo, half are unrelated
+    probes = []
+    for i in range(queries):
+        if i % 2:
+            probes.append(flip_bits(rng.choice(hashes), rng.randint(0, radius), rng))
+        else:
+            probes.append(rng.getrandbits(64))
+
+    timings, found = [], 0
+    for value in probes:
+        t0 = time.perf_counter()
+        matches = index.search(value, radius)
+        timings.append(time.perf_counter() - t0)
+        found += bool(matches)
+
+    t0 = time.perf_counter()
+    for value in probes[:20]:
+        [h for h in hashes if (h ^ value).bit_count() <= radius]
+    linear = (time.perf_counter() - t0) / 20
+
+    print(f"Index of {photos} hashes built in {build * 1000:.0f} ms")
+    print(f"Lookup (radius {radius}): p50 {percentile(timings, 50) * 1000:.3f} ms, "
+          f"p99 {percentile(timings, 99) * 1000:.3f} ms, {found}/{queries} with a match")
+    print(f"Linear scan: {linear * 1000:.1f} ms per lookup")
+
+def synthetic_photo(rng, size=(1600, 1200)):
+    img = Image.new('RGB', size, (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x, y = rng.randint(0, size[0]), rng.randint(0, size[1])
+        r = rng.randint(40, 300)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randint(0, 255) for _ in range(3)))
+    return img
+
+def jpeg(img, quality):
+    buf = io.BytesIO()
+    img.save(buf, 'JPEG', quality=quality)
+    buf.seek(0)
+    return Image.open(buf)
+
+def thumb(img):
+    img = img.copy()
+    img.thumbnail((300, 300))
+    return img
+
+def bench_hash(rng):
+    original = synthetic_photo(rng)
+    base = perceptual_hash(thumb(original))
+    w, h = original.size
+    edits = {
+        "JPEG quality 40": jpeg(original, 40),
+        "resized to 50%": original.resize((w // 2, h // 2)),
+        "brightness +20%": ImageEnhance.Brightness(original).enhance(1.2),
+        "cropped 5%": original.crop((w // 40, h // 40, w - w // 40, h - h // 40)),
+        "chat forward (800px, q60)": jpeg(original.resize((800, 600)), 60),
+        "different photo": synthetic_photo(rng)
+    }
+    for name, img in edits.items():
+        print(f"  {name:<28} distance {(perceptual_hash(thumb(img)) ^ base).bit_count()}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--photos', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--radius', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    bench_index(args.photos, args.queries, args.radius, rng)
+    print("Perceptual hash distance to the original:")
+    bench_hash(rng)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Records MySQL query plans for the gallery visibility query on a seeded database.
+
+    python benchmarks/seed.py --scale large --truncate
+    python benchmarks/explain_gallery.py [--analyze] [--out benchmarks/results/explain_gallery.txt]
+
+Uses the largest group and, where possible, a member that has blocks and hides,
+so every anti-join in GALLERY_SQL is exercised. --analyze uses EXPLAIN ANALYZE
+(MySQL 8.0.18+) which actually runs the statements and reports real timings.
+"""
+import os
+import sys
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import get_db_connection
+from routes.photos import GALLERY_SQL
+
+DEFAULT_OUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', 'explain_gallery.txt')
+
+def pick_subject(cursor):
+    cursor.execute("SELECT group_id, COUNT(*) AS n FROM photos GROUP BY group_id ORDER BY n DESC LIMIT 1")
+    group = cursor.fetchone()
+    cursor.execute("""
+        SELECT gm.user_id FROM groups_members gm
+        WHERE gm.group_id = %s
+        ORDER BY (SELECT COUNT(*) FROM blocked_users b WHERE b.blocker_id = gm.user_id OR b.blocked_id = gm.user_id)
+               + (SELECT COUNT(*) FROM hidden_photos h WHERE h.user_id = gm.user_id) DESC
+        LIMIT 1
+    """, (group['group_id'],))
+    return group['group_id'], group['n'], cursor.fetchone()['user_id']
+
+def statements(cursor, group_id, user_id):
+    base = (group_id, user_id, user_id, user_id)
+    order = " ORDER BY photos.upload_date DESC, photos.id DESC"
+
+    cursor.execute(GALLERY_SQL + order + " LIMIT 1 OFFSET 500", base)
+    mid = cursor.fetchone()
+    seek = " AND (photos.upload_date < %s OR (photos.upload_date = %s AND photos.id < %s))"
+
+    taken_order = " ORDER BY photos.taken_at DESC, photos.id DESC"
+    taken_seek = " AND (photos.taken_at < %s OR (photos.taken_at = %s AND photos.id < %s))"
+
+    return [
+        ("membership check", "SELECT id FROM groups_members WHERE user_id = %s AND group_id = %s", (user_id, group_id)),
+        ("gallery first page (limit 50)", GALLERY_SQL + order + " LIMIT 51", base),
+        ("gallery next page (cursor seek)", GALLERY_SQL + seek + order + " LIMIT 51",
+         base + (mid['upload_date'], mid['upload_date'], mid['id']) if mid else base + (datetime.utcnow(),) * 2 + (0,)),
+        ("gallery full list (legacy)", GALLERY_SQL + order, base),
+        ("gallery by capture time, first page (sort=taken)", GALLERY_SQL + taken_order + " LIMIT 51", base),
+        ("gallery by capture time, next page (sort=taken)", GALLERY_SQL + taken_seek + taken_order + " LIMIT 51",
+         base + (mid['taken_at'], mid['taken_at'], mid['id']) if mid else base + (datetime.utcnow(),) * 2 + (0,))
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--analyze', action='store_true')
+    parser.add_argument('--out', default=DEFAULT_OUT)
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    cursor.execute("SELECT VERSION() AS v")
+    version = cursor.fetchone()['v']
+    cursor.execute("SELECT COUNT(*) AS n FROM photos")
+    total_photos = cursor.fetchone()['n']
+    group_id, group_photos, user_id = pick_subject(cursor)
+
+    lines = [
+        f"# Gallery query plans - {datetime.utcnow().isoformat()}Z",
+        f"# MySQL {version}, {total_photos} photos, group {group_id} ({group_photos} photos), viewer {user_id}",
+        ""
+    ]
+
+    prefix = "EXPLAIN ANALYZE " if args.analyze else "EXPLAIN FORMAT=TREE "
+    for title, sql, params in statements(cursor, group_id, user_id):
+        cursor.execute(prefix + sql, params)
+        plan = "\n".join(str(list(row.values())[0]) for row in cursor.fetchall())
+        lines += [f"## {title}", plan, ""]
+
+    cursor.close(); conn.close()
+
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, 'w') as f:
+        f.write("\n".join(lines))
+    print("\n".join(lines))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Local stand-in for the Expo push API, for tests and benchmarks.
+
+    python benchmarks/fake_push_server.py --port 8055 --latency 0.2 --error-rate 0.1
+    EXPO_PUSH_URL=http://127.0.0.1:8055/--/api/v2/push/send python app.py
+
+POST /--/api/v2/push/send answers like Expo ({"data": [{"status": "ok", "id": ...}]}),
+rejects batches over 100 messages with 400, and fails `--error-rate` of requests with 503.
+GET /stats returns what was received; POST /reset clears it.
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MAX_MESSAGES = 100
+
+class FakePushState:
+    def __init__(self, latency=0.0, error_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.messages = 0
+            self.errors = 0
+            self.rejected = 0
+            self.max_batch = 0
+            self.last_messages = []
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "messages": self.messages,
+                "errors": self.errors,
+                "rejected": self.rejected,
+                "max_batch": self.max_batch,
+                "last_messages": self.last_messages[-20:]
+            }
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                return self._reply(200, state.snapshot())
+            self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path == '/reset':
+                state.reset()
+                return self._reply(200, {"ok": True})
+            if self.path != '/--/api/v2/push/send':
+                return self._reply(404, {"error": "not found"})
+
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'[]')
+            messages = payload if isinstance(payload, list) else [payload]
+
+            if state.latency:
+                time.sleep(state.latency)
+
+            with state.lock:
+                state.requests += 1
+                if len(messages) > MAX_MESSAGES:
+                    state.rejected += 1
+                    return self._reply(400, {"errors": [{"code": "PUSH_TOO_MANY_NOTIFICATIONS"}]})
+                if random.random() < state.error_rate:
+                    state.errors += 1
+                    return self._reply(503, {"errors": [{"code": "INTERNAL_SERVER_ERROR"}]})
+                state.messages += len(messages)
+                state.max_batch = max(state.max_batch, len(messages))
+                state.last_messages.extend(messages)
+                del state.last_messages[:-20]
+
+            self._reply(200, {"data": [{"status": "ok", "id": f"fake-{random.getrandbits(32):08x}"} for _ in messages]})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(port=8055, latency=0.0, error_rate=0.0):
+    """Starts the server in a background thread and returns (server, state)."""
+    state = FakePushState(latency, error_rate)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8055)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before answering')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with 503')
+    args = parser.parse_args()
+
+    state = FakePushState(args.latency, args.error_rate)
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(state))
+    print(f"Fake push server on http://127.0.0.1:{args.port}/--/api/v2/push/send")
+    server.serve_forever()
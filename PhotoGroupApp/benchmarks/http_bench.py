@@ -0,0 +1,334 @@
+"""
+End-to-end HTTP benchmark: drives the auth, groups, photos and admin endpoints of a
+running server with a weighted request mix at fixed concurrency.
+
+    python benchmarks/seed.py --scale small --truncate
+    python app.py                                   # or any WSGI server, same .env
+    python benchmarks/http_bench.py --concurrency 16 --duration 60
+    python benchmarks/http_bench.py --compare benchmarks/results/http_<old>.json
+
+Test users, groups and photos are sampled from the seeded database (same --seed =
+same sample). Results (throughput, p50/p95/p99 per endpoint, status codes) go to
+benchmarks/results/http_<commit>_<time>.json. The write endpoints (uploads, hides,
+join requests, notification toggles) change the data set: re-seed before runs that
+should be compared, or use --read-only.
+"""
+import io
+import os
+import math
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+import threading
+import subprocess
+from datetime import datetime
+from collections import defaultdict
+
+import requests
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import get_db_connection
+import seed as seeder
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+SAMPLE_SIZE = 2000
+
+# =====================================================
+# TEST DATA
+# =====================================================
+class World:
+    """What the scenarios pick from: sampled memberships, group codes, an admin, an upload."""
+
+    def __init__(self, base_url, rng):
+        self.base = base_url.rstrip('/')
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        cursor.execute("SELECT MAX(id) AS n FROM groups_members")
+        max_member = cursor.fetchone()['n'] or 0
+        ids = rng.sample(range(1, max_member + 1), min(SAMPLE_SIZE, max_member))
+        if not ids:
+            sys.exit("No memberships found. Seed the database first (benchmarks/seed.py).")
+        format_strings = ','.join(['%s'] * len(ids))
+        cursor.execute(f"""
+            SELECT gm.user_id, gm.group_id, u.phone_number FROM groups_members gm
+            JOIN users u ON u.id = gm.user_id WHERE gm.id IN ({format_strings}) ORDER BY gm.id
+        """, tuple(ids))
+        rows = cursor.fetchall()
+        self.memberships = [(r['user_id'], r['group_id']) for r in rows]
+        self.phones = [r['phone_number'] for r in rows]
+
+        cursor.execute("SELECT id, group_code FROM groups_table ORDER BY id LIMIT %s", (SAMPLE_SIZE,))
+        self.group_codes = [r['group_code'] for r in cursor.fetchall()]
+
+        cursor.execute("SELECT MAX(id) AS n FROM photos")
+        self.max_photo_id = cursor.fetchone()['n'] or 1
+
+        cursor.execute("SELECT id FROM users WHERE is_super_admin = 1 ORDER BY id LIMIT 1")
+        admin = cursor.fetchone()
+        self.admin_id = admin['id'] if admin else None
+
+        cursor.execute("SELECT COUNT(*) AS n FROM users")
+        users = cursor.fetchone()['n']
+        cursor.execute("SELECT COUNT(*) AS n FROM photos")
+        photos = cursor.fetchone()['n']
+        self.dataset = {"users": users, "photos": photos, "memberships": max_member}
+
+        cursor.close(); conn.close()
+
+        buf = io.BytesIO()
+        Image.new('RGB', (1600, 1200), (90, 140, 200)).save(buf, 'JPEG', quality=85)
+        self.jpeg = buf.getvalue()
+
+    def member(self, rng):
+        return rng.choice(self.memberships)
+
+# =====================================================
+# SCENARIOS
+# =====================================================
+# (name, weight, writes, fn(session, world, rng) -> response). Weights approximate the
+# app: mostly gallery / group list browsing, a few uploads and admin page views.
+def gallery_page(s, w, rng):
+    user_id, group_id = w.member(rng)
+    return s.get(f"{w.base}/group-photos", params={"group_id": group_id, "user_id": user_id, "limit": 50})
+
+def my_groups(s, w, rng):
+    return s.get(f"{w.base}/my-groups", params={"user_id": w.member(rng)[0]})
+
+def group_members(s, w, rng):
+    user_id, group_id = w.member(rng)
+    return s.get(f"{w.base}/get-group-members", params={"group_id": group_id, "current_user_id": user_id})
+
+def group_details(s, w, rng):
+    return s.get(f"{w.base}/get-group-details", params={"group_id": w.member(rng)[1]})
+
+def get_user(s, w, rng):
+    return s.get(f"{w.base}/get-user", params={"user_id": w.member(rng)[0]})
+
+def blocked_users(s, w, rng):
+    return s.get(f"{w.base}/get-blocked-users", params={"user_id": w.member(rng)[0]})
+
+def group_requests(s, w, rng):
+    return s.get(f"{w.base}/get-group-requests", params={"group_id": w.member(rng)[1]})
+
+def login(s, w, rng):
+    return s.post(f"{w.base}/login", json={"phone_number": rng.choice(w.phones), "password": seeder.SEED_PASSWORD})
+
+def admin_reports(s, w, rng):
+    return s.get(f"{w.base}/admin/get-reports", params={"admin_id": w.admin_id})
+
+def admin_banned(s, w, rng):
+    return s.get(f"{w.base}/admin/get-banned-users", params={"admin_id": w.admin_id})
+
+def upload_photo(s, w, rng):
+    user_id, group_id = w.member(rng)
+    files = {"photo": ("bench.jpg", w.jpeg, "image/jpeg")}
+    return s.post(f"{w.base}/upload-photo", data={"user_id": user_id, "group_id": group_id}, files=files)
+
+def hide_photo(s, w, rng):
+    return s.post(f"{w.base}/bulk-action", json={
+        "user_id": w.member(rng)[0], "photo_ids": [rng.randint(1, w.max_photo_id)], "action_type": "hide"
+    })
+
+def block_user(s, w, rng):
+    return s.post(f"{w.base}/block-user", json={"blocker_id": w.member(rng)[0], "blocked_id": w.member(rng)[0]})
+
+def unblock_user(s, w, rng):
+    return s.post(f"{w.base}/unblock-user", json={"blocker_id": w.member(rng)[0], "blocked_id": w.member(rng)[0]})
+
+def join_group(s, w, rng):
+    return s.post(f"{w.base}/join-group", json={"user_id": w.member(rng)[0], "group_code": rng.choice(w.group_codes)})
+
+def toggle_notifications(s, w, rng):
+    user_id, group_id = w.member(rng)
+    return s.post(f"{w.base}/toggle-notifications", json={"user_id": user_id, "group_id": group_id})
+
+SCENARIOS = [
+    ("GET /group-photos", 35, False, gallery_page),
+    ("GET /my-groups", 15, False, my_groups),
+    ("GET /get-group-members", 10, False, group_members),
+    ("GET /get-user", 8, False, get_user),
+    ("GET /get-group-details", 5, False, group_details),
+    ("GET /get-blocked-users", 3, False, blocked_users),
+    ("GET /get-group-requests", 2, False, group_requests),
+    ("POST /login", 2, False, login),
+    ("GET /admin/get-reports", 2, False, admin_reports),
+    ("GET /admin/get-banned-users", 1, False, admin_banned),
+    ("POST /upload-photo", 3, True, upload_photo),
+    ("POST /bulk-action (hide)", 2, True, hide_photo),
+    ("POST /block-user", 1, True, block_user),
+    ("POST /unblock-user", 1, True, unblock_user),
+    ("POST /join-group", 2, True, join_group),
+    ("POST /toggle-notifications", 2, True, toggle_notifications),
+]
+
+# =====================================================
+# RUNNER
+# =====================================================
+def worker(index, world, scenarios, cum_weights, start, warmup, deadline, seed, out):
+    rng = random.Random(seed * 1000 + index)
+    session = requests.Session()
+    samples = defaultdict(list)   # name -> [(seconds, status)]
+    while True:
+        t0 = time.perf_counter()
+        if t0 >= deadline:
+            break
+        name, _, _, fn = rng.choices(scenarios, cum_weights=cum_weights)[0]
+        try:
+            status = fn(session, world, rng).status_code
+        except requests.RequestException:
+            status = 'error'
+        if t0 >= start + warmup:
+            samples[name].append((time.perf_counter() - t0, status))
+    out[index] = samples
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    k = math.ceil(p / 100 * len(sorted_values)) - 1
+    return sorted_values[max(0, k)]
+
+def summarize(samples, duration):
+    endpoints = {}
+    for name, entries in sorted(samples.items()):
+        latencies = sorted(e[0] for e in entries)
+        statuses = defaultdict(int)
+        for _, status in entries:
+            statuses[str(status)] += 1
+        errors = sum(n for status, n in statuses.items() if status == 'error' or int(status) >= 500)
+        endpoints[name] = {
+            "requests": len(entries),
+            "rps": round(len(entries) / duration, 2),
+            "errors": errors,
+            "status": dict(statuses),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2)
+        }
+    all_latencies = sorted(e[0] for entries in samples.values() for e in entries)
+    total = len(all_latencies)
+    totals = {
+        "requests": total,
+        "rps": round(total / duration, 2),
+        "errors": sum(e["errors"] for e in endpoints.values()),
+        "p50_ms": round(percentile(all_latencies, 50) * 1000, 2) if total else None,
+        "p95_ms": round(percentile(all_latencies, 95) * 1000, 2) if total else None,
+        "p99_ms": round(percentile(all_latencies, 99) * 1000, 2) if total else None
+    }
+    return totals, endpoints
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except Exception:
+        return 'unknown'
+
+def print_report(report, baseline=None):
+    def delta(new, old):
+        if new is None or not old:
+            return ''
+        return f" ({(new - old) / old * 100:+.0f}%)"
+
+    print(f"\n{'endpoint':<32}{'req/s':>16}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}{'err':>6}")
+    rows = list(report["endpoints"].items()) + [("TOTAL", report["totals"])]
+    for name, e in rows:
+        old = (baseline or {}).get("endpoints", {}).get(name) if name != "TOTAL" else (baseline or {}).get("totals")
+        old = old or {}
+        print(f"{name:<32}"
+              f"{str(e['rps']) + delta(e['rps'], old.get('rps')):>16}"
+              f"{str(e['p50_ms']) + delta(e['p50_ms'], old.get('p50_ms')):>18}"
+              f"{str(e['p95_ms']) + delta(e['p95_ms'], old.get('p95_ms')):>18}"
+              f"{str(e['p99_ms']) + delta(e['p99_ms'], old.get('p99_ms')):>18}"
+              f"{e['errors']:>6}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=60, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds run before measuring')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for sampling and the request mix')
+    parser.add_argument('--read-only', action='store_true', help='skip endpoints that write')
+    parser.add_argument('--only', help='comma separated endpoint names to run (e.g. "GET /my-groups")')
+    parser.add_argument('--reseed', choices=seeder.SCALES, help='wipe and seed the database at this scale first')
+    parser.add_argument('--out', help='result file (default benchmarks/results/http_<commit>_<time>.json)')
+    parser.add_argument('--compare', help='earlier result file to show deltas against')
+    args = parser.parse_args()
+
+    if args.reseed:
+        conn = get_db_connection()
+        seeder.truncate(conn)
+        seeder.seed(conn, dict(seeder.SCALES[args.reseed]), random.Random(args.seed))
+        conn.close()
+
+    scenarios = [s for s in SCENARIOS if not (args.read_only and s[2])]
+    if args.only:
+        wanted = {name.strip() for name in args.only.split(',')}
+        scenarios = [s for s in scenarios if s[0] in wanted]
+    if not scenarios:
+        sys.exit("No scenarios selected.")
+
+    world = World(args.base_url, random.Random(args.seed))
+    if world.admin_id is None:
+        scenarios = [s for s in scenarios if not s[0].startswith('GET /admin')]
+    cum_weights = list(itertools.accumulate(s[1] for s in scenarios))
+
+    print(f"{len(scenarios)} endpoints, concurrency {args.concurrency}, "
+          f"{args.warmup:g}s warm-up + {args.duration:g}s against {world.base}")
+    start = time.perf_counter()
+    deadline = start + args.warmup + args.duration
+    out = {}
+    threads = [threading.Thread(target=worker, args=(i, world, scenarios, cum_weights, start, args.warmup,
+                                                     deadline, args.seed, out))
+               for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    samples = defaultdict(list)
+    for worker_samples in out.values():
+        for name, entries in worker_samples.items():
+            samples[name].extend(entries)
+    totals, endpoints = summarize(samples, args.duration)
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.utcnow().isoformat() + 'Z',
+            "base_url": world.base,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "read_only": args.read_only,
+            "dataset": world.dataset,
+            "mix": {name: weight for name, weight, _, _ in scenarios}
+        },
+        "totals": totals,
+        "endpoints": endpoints
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    out_path = args.out or os.path.join(RESULTS_DIR, f"http_{commit}_{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {out_path}")
+
+if __name__ == '__main__':
+    main()
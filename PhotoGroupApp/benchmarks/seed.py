@@ -0,0 +1,135 @@
+"""
+Seeds the database configured in .env with synthetic data for benchmarks.
+
+    python benchmarks/seed.py --scale large --truncate
+
+WARNING: --truncate wipes users, groups, photos, blocks and hides first.
+Run it against a throwaway database only.
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import itertools
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from werkzeug.security import generate_password_hash
+from db import get_db_connection
+
+# users, groups, memberships per user, photos, blocks, hides
+SCALES = {
+    'small':  dict(users=200,    groups=50,    memberships=5,  photos=10000,   blocks=200,   hides=2000),
+    'medium': dict(users=5000,   groups=1000,  memberships=8,  photos=100000,  blocks=5000,  hides=20000),
+    'large':  dict(users=50000,  groups=10000, memberships=10, photos=1000000, blocks=50000, hides=200000)
+}
+
+# Default password of every seeded user (benchmarks log in with it)
+SEED_PASSWORD = 'bench-password'
+BATCH = 5000
+
+TABLES = ['upload_sessions', 'hidden_photos', 'blocked_users', 'content_reports', 'media_jobs', 'media_blobs',
+          'photos', 'group_requests', 'groups_members', 'groups_table', 'users']
+
+def batched_insert(conn, cursor, sql, rows):
+    for i in range(0, len(rows), BATCH):
+        cursor.executemany(sql, rows[i:i + BATCH])
+        conn.commit()
+
+def seed(conn, scale, rng):
+    cursor = conn.cursor()
+    password_hash = generate_password_hash(SEED_PASSWORD)
+    now = datetime.utcnow().replace(microsecond=0)
+
+    # Users (ids 1..N), user 1 is a super admin (admin endpoints in http_bench.py)
+    users = [(i, f"user{i}", f"user{i}@bench.local", password_hash, f"5{i:09d}", 1 if i == 1 else 0) for i in range(1, scale['users'] + 1)]
+    batched_insert(conn, cursor, "INSERT INTO users (id, username, email, password_hash, phone_number, is_super_admin) VALUES (%s, %s, %s, %s, %s, %s)", users)
+
+    # Groups (ids 1..G), creator is the first admin
+    creators = {g: rng.randint(1, scale['users']) for g in range(1, scale['groups'] + 1)}
+    groups = [(g, f"B{g:07d}", creators[g], f"Bench Group {g}") for g in creators]
+    batched_insert(conn, cursor, "INSERT INTO groups_table (id, group_code, created_by, group_name) VALUES (%s, %s, %s, %s)", groups)
+
+    # Memberships: group sizes follow a skewed distribution (a few very large groups)
+    members = {g: {creators[g]} for g in creators}
+    group_ids = list(creators)
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(group_ids))))
+    for user_id in range(1, scale['users'] + 1):
+        for g in rng.choices(group_ids, cum_weights=cum_weights, k=scale['memberships']):
+            members[g].add(user_id)
+    membership_rows = [(u, g, 1 if u == creators[g] else 0) for g, users_in in members.items() for u in users_in]
+    batched_insert(conn, cursor, "INSERT INTO groups_members (user_id, group_id, is_admin) VALUES (%s, %s, %s)", membership_rows)
+
+    # Photos: photo count per group proportional to its member count
+    member_lists = {g: list(u) for g, u in members.items()}
+    sizes = [len(member_lists[g]) for g in group_ids]
+    photo_groups = rng.choices(group_ids, weights=sizes, k=scale['photos'])
+    photo_rows = []
+    for photo_id, g in enumerate(photo_groups, start=1):
+        uploader = rng.choice(member_lists[g])
+        upload_date = now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+        # Taken up to a month before upload, so sort=taken differs from upload order
+        taken_at = upload_date - timedelta(seconds=rng.randint(0, 30 * 24 * 3600))
+        photo_rows.append((photo_id, f"seed/{photo_id % 100:02d}/{photo_id}.jpg", uploader, g, upload_date, taken_at))
+        if len(photo_rows) >= BATCH:
+            batched_insert(conn, cursor, "INSERT INTO photos (id, file_name, user_id, group_id, upload_date, taken_at) VALUES (%s, %s, %s, %s, %s, %s)", photo_rows)
+            photo_rows = []
+    if photo_rows:
+        batched_insert(conn, cursor, "INSERT INTO photos (id, file_name, user_id, group_id, upload_date, taken_at) VALUES (%s, %s, %s, %s, %s, %s)", photo_rows)
+
+    # Blocks and hides
+    blocks = set()
+    while len(blocks) < scale['blocks']:
+        a, b = rng.randint(1, scale['users']), rng.randint(1, scale['users'])
+        if a != b:
+            blocks.add((a, b))
+    batched_insert(conn, cursor, "INSERT INTO blocked_users (blocker_id, blocked_id) VALUES (%s, %s)", list(blocks))
+
+    hides = set()
+    while len(hides) < scale['hides']:
+        hides.add((rng.randint(1, scale['users']), rng.randint(1, scale['photos'])))
+    batched_insert(conn, cursor, "INSERT INTO hidden_photos (user_id, photo_id) VALUES (%s, %s)", list(hides))
+
+    cursor.close()
+    return {"memberships": len(membership_rows), "largest_group_members": max(sizes)}
+
+def truncate(conn):
+    cursor = conn.cursor()
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+    for table in TABLES:
+        cursor.execute(f"TRUNCATE TABLE {table}")
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    conn.commit()
+    cursor.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--truncate', action='store_true', help='wipe the benchmark tables first')
+    parser.add_argument('--seed', type=int, default=42, help='random seed (same seed = same dataset)')
+    for key in SCALES['small']:
+        parser.add_argument(f'--{key}', type=int, help=f'override number of {key}')
+    args = parser.parse_args()
+
+    scale = dict(SCALES[args.scale])
+    for key in scale:
+        if getattr(args, key) is not None:
+            scale[key] = getattr(args, key)
+
+    conn = get_db_connection()
+    if args.truncate:
+        truncate(conn)
+    else:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM users")
+        if cursor.fetchone()[0]:
+            sys.exit("Database is not empty. Re-run with --truncate to wipe it first.")
+        cursor.close()
+
+    stats = seed(conn, scale, random.Random(args.seed))
+    conn.close()
+    print(json.dumps({"scale": scale, **stats}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,11 @@
 import mysql.connector
 import os
+import threading
+import time
 from dotenv import load_dotenv
+from flask import g, has_app_context
+import metrics
+from querylog import query_log
 
 # Load environment variables
 load_dotenv()
@@ -13,6 +18,282 @@ db_config = {
     'database': os.getenv('DB_NAME')
 }
 
+# Connection pool settings (also from .env, with safe defaults)
+pool_config = {
+    'size': int(os.getenv('DB_POOL_SIZE', 5)),               # Connections kept open while idle
+    'max_overflow': int(os.getenv('DB_POOL_MAX_OVERFLOW', 10)),  # Extra connections allowed during spikes
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),      # Seconds to wait for a free connection
+    'recycle': int(os.getenv('DB_POOL_RECYCLE', 3600)),      # Reconnect connections older than this (seconds)
+    'pre_ping': os.getenv('DB_POOL_PRE_PING', '1') == '1'    # Ping connection on checkout
+}
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the pool timeout."""
+
+
+class TimedCursor:
+    """
+    Cursor proxy that times every statement: feeds /metrics and the slow query
+    log / per-statement stats (querylog.py, served at /db-query-stats).
+    """
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._raw.execute(operation, params, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.observe_query(elapsed)
+            query_log.record(operation, params, elapsed)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._raw.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.observe_query(elapsed)
+            query_log.record(operation, None, elapsed, many=True)
+
+
+class PooledConnection:
+    """
+    Thin proxy around a MySQL connection.
+    Everything is delegated to the real connection except close(),
+    which hands the connection back to the pool instead of dropping it,
+    and cursor(), whose statements are timed.
+    """
+
+    def __init__(self, pool, raw, created_at, request_scoped=False):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._request_scoped = request_scoped
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise mysql.connector.errors.OperationalError("Connection already returned to the pool")
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        if self._raw is None:
+            raise mysql.connector.errors.OperationalError("Connection already returned to the pool")
+        return TimedCursor(self._raw.cursor(*args, **kwargs))
+
+    def untimed_cursor(self, *args, **kwargs):
+        """Plain cursor, for statements that must not show up in the stats (EXPLAIN)."""
+        return self.__getattr__('cursor')(*args, **kwargs)
+
+    def close(self):
+        # Request scoped connections are returned by the teardown hook
+        if self._request_scoped:
+            return
+        self.release()
+
+    def release(self):
+        if self._raw is None:
+            return
+        raw, self._raw = self._raw, None
+        self._pool.release(raw, self._created_at)
+
+
+class ConnectionPool:
+    """
+    Thread-safe MySQL connection pool.
+    Keeps up to `size` idle connections, allows `max_overflow` extra ones under load,
+    pings connections on checkout and recycles them after `recycle` seconds.
+    """
+
+    def __init__(self, config, size=5, max_overflow=10, timeout=30, recycle=3600, pre_ping=True):
+        self.config = config
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._idle = []  # [(raw_connection, created_at)]
+        self._open = 0
+        self._cond = threading.Condition()
+
+        # Stats
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        self._recycled = 0
+        self._ping_failures = 0
+
+    def _connect(self):
+        return mysql.connector.connect(**self.config), time.monotonic()
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def checkout(self, request_scoped=False):
+        raw, created_at = None, None
+        wait_started = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, created_at = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    self._open += 1
+                    break
+
+                # Pool exhausted: wait for a release
+                if wait_started is None:
+                    wait_started = time.monotonic()
+                    self._waits += 1
+                remaining = self.timeout - (time.monotonic() - wait_started)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    self._wait_time += time.monotonic() - wait_started
+                    raise PoolTimeoutError(f"No database connection available after {self.timeout}s")
+                self._cond.wait(remaining)
+
+            if wait_started is not None:
+                self._wait_time += time.monotonic() - wait_started
+            self._in_use += 1
+            self._checkouts += 1
+
+        try:
+            if raw is not None:
+                if self.recycle and time.monotonic() - created_at > self.recycle:
+                    self._discard(raw)
+                    raw = None
+                    with self._cond:
+                        self._recycled += 1
+                elif self.pre_ping:
+                    try:
+                        raw.ping(reconnect=False)
+                    except Exception:
+                        self._discard(raw)
+                        raw = None
+                        with self._cond:
+                            self._ping_failures += 1
+
+            if raw is None:
+                raw, created_at = self._connect()
+        except Exception:
+            # Could not (re)connect: give the slot back
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        return PooledConnection(self, raw, created_at, request_scoped)
+
+    def release(self, raw, created_at):
+        healthy = True
+        try:
+            # Never hand out a connection with half-finished work on it
+            if raw.in_transaction:
+                raw.rollback()
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            expired = self.recycle and time.monotonic() - created_at > self.recycle
+            if healthy and not expired and len(self._idle) < self.size:
+                self._idle.append((raw, created_at))
+                raw = None
+            else:
+                self._open -= 1
+                if expired:
+                    self._recycled += 1
+            self._cond.notify()
+
+        if raw is not None:
+            self._discard(raw)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_seconds": round(self._wait_time, 6),
+                "timeouts": self._timeouts,
+                "recycled": self._recycled,
+                "ping_failures": self._ping_failures
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Returns the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(db_config, **pool_config)
+    return _pool
+
 def get_db_connection():
-    """Establishes and returns a connection to the MySQL database."""
-    return mysql.connector.connect(**db_config)
\ No newline at end of file
+    """
+    Returns a pooled connection to the MySQL database.
+    Inside a Flask request the same connection is reused for the whole request
+    and returned to the pool by the teardown hook; close() is then a no-op.
+    """
+    if has_app_context():
+        return get_request_connection()
+    return get_pool().checkout()
+
+def get_request_connection():
+    """Checks a connection out once per request and stores it on flask.g."""
+    conn = g.get('db_conn')
+    if conn is None:
+        conn = get_pool().checkout(request_scoped=True)
+        g.db_conn = conn
+    return conn
+
+def release_request_connection(exception=None):
+    """Teardown hook: returns the request's connection (if any) to the pool."""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        conn.release()
+
+def get_pool_stats():
+    return get_pool().stats()
+
+def _pool_metrics():
+    stats = get_pool_stats()
+    return [
+        ("db_pool_connections", "gauge", "Pool connections by state.",
+         [({"state": "open"}, stats["open"]), ({"state": "idle"}, stats["idle"]), ({"state": "in_use"}, stats["in_use"])]),
+        ("db_pool_checkouts_total", "counter", "Connections handed out.", [({}, stats["checkouts"])]),
+        ("db_pool_waits_total", "counter", "Checkouts that had to wait for a free connection.", [({}, stats["waits"])]),
+        ("db_pool_wait_seconds_total", "counter", "Time spent waiting for a connection.", [({}, stats["wait_time_seconds"])]),
+        ("db_pool_timeouts_total", "counter", "Checkouts that gave up waiting.", [({}, stats["timeouts"])])
+    ]
+
+metrics.register_collector(_pool_metrics)
+
+def init_app(app):
+    """Registers the teardown hook that returns request connections to the pool."""
+    app.teardown_appcontext(release_request_connection)
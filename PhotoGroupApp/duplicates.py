@@ -0,0 +1,154 @@
+import os
+import time
+import threading
+from itertools import combinations
+from functools import lru_cache
+from collections import OrderedDict
+from db import get_db_connection
+
+# =====================================================
+# NEAR-DUPLICATE DETECTION
+# =====================================================
+# photos.phash holds a 64-bit perceptual hash (media.perceptual_hash). Two photos
+# are near duplicates when their hashes differ in at most DUPLICATE_MAX_DISTANCE bits.
+# Each group gets an in-memory multi-index hash table: the hash is cut into four
+# 16-bit chunks, each with its own table. Two hashes within distance r agree to
+# within r // 4 bits on at least one chunk (pigeonhole), so a lookup probes every
+# chunk value that close and only compares the few candidates it finds.
+# Indexes are loaded lazily from the database, kept per process for
+# DUPLICATE_INDEX_TTL seconds and updated in place when this process hashes a photo.
+
+DUPLICATE_MAX_DISTANCE = int(os.getenv('DUPLICATE_MAX_DISTANCE', 8))
+DUPLICATE_INDEX_TTL = float(os.getenv('DUPLICATE_INDEX_TTL', 300))
+DUPLICATE_INDEX_GROUPS = int(os.getenv('DUPLICATE_INDEX_GROUPS', 64))
+
+CHUNKS = 4
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+@lru_cache(maxsize=None)
+def _flip_masks(radius):
+    """Every CHUNK_BITS-bit mask with at most `radius` bits set."""
+    masks = [0]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), r):
+            masks.append(sum(1 << b for b in bits))
+    return tuple(masks)
+
+
+class HammingIndex:
+    """Shared by request threads (search) and the media worker (add/discard): all access is locked."""
+
+    def __init__(self):
+        self.hashes = {}                                # photo_id -> hash
+        self.tables = [{} for _ in range(CHUNKS)]      # chunk value -> set of photo_ids
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, photo_id, value):
+        with self._lock:
+            self._discard(photo_id)
+            self.hashes[photo_id] = value
+            for i, table in enumerate(self.tables):
+                table.setdefault((value >> (i * CHUNK_BITS)) & CHUNK_MASK, set()).add(photo_id)
+
+    def discard(self, photo_id):
+        with self._lock:
+            self._discard(photo_id)
+
+    def _discard(self, photo_id):
+        value = self.hashes.pop(photo_id, None)
+        if value is None:
+            return
+        for i, table in enumerate(self.tables):
+            bucket = table.get((value >> (i * CHUNK_BITS)) & CHUNK_MASK)
+            if bucket:
+                bucket.discard(photo_id)
+
+    def search(self, value, radius=DUPLICATE_MAX_DISTANCE):
+        """[(photo_id, distance)] of every hash within `radius` bits, closest first."""
+        masks = _flip_masks(radius // CHUNKS)
+        matches = []
+        with self._lock:
+            candidates = set()
+            for i, table in enumerate(self.tables):
+                chunk = (value >> (i * CHUNK_BITS)) & CHUNK_MASK
+                for mask in masks:
+                    bucket = table.get(chunk ^ mask)
+                    if bucket:
+                        candidates.update(bucket)
+
+            for photo_id in candidates:
+                distance = (value ^ self.hashes[photo_id]).bit_count()
+                if distance <= radius:
+                    matches.append((photo_id, distance))
+        matches.sort(key=lambda m: (m[1], m[0]))
+        return matches
+
+
+_indexes = OrderedDict()   # group_id -> (loaded_at, HammingIndex), least recently used first
+_lock = threading.Lock()
+
+def load_index(group_id):
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        # Covered by idx_photos_group_phash
+        cursor.execute("SELECT id, phash FROM photos WHERE group_id = %s AND phash IS NOT NULL", (group_id,))
+        index = HammingIndex()
+        for row in cursor.fetchall():
+            index.add(row['id'], int(row['phash']))
+        return index
+    finally:
+        cursor.close(); conn.close()
+
+def get_index(group_id):
+    key = str(group_id)
+    with _lock:
+        entry = _indexes.get(key)
+        if entry and time.monotonic() - entry[0] < DUPLICATE_INDEX_TTL:
+            _indexes.move_to_end(key)
+            return entry[1]
+
+    # Built outside the lock: a concurrent rebuild of the same group only costs time
+    index = load_index(group_id)
+    with _lock:
+        _indexes[key] = (time.monotonic(), index)
+        _indexes.move_to_end(key)
+        while len(_indexes) > DUPLICATE_INDEX_GROUPS:
+            _indexes.popitem(last=False)
+    return index
+
+def _existing(cursor, photo_ids):
+    """The ids that still exist (the index may hold photos deleted by another process)."""
+    if not photo_ids:
+        return set()
+    format_strings = ','.join(['%s'] * len(photo_ids))
+    cursor.execute(f"SELECT id FROM photos WHERE id IN ({format_strings})", tuple(photo_ids))
+    return {row['id'] if isinstance(row, dict) else row[0] for row in cursor.fetchall()}
+
+def find_original(cursor, group_id, photo_id, phash):
+    """
+    Called once a photo is hashed: returns the id of the oldest earlier photo of the
+    group it nearly duplicates (None if there is none) and adds it to the index.
+    """
+    index = get_index(group_id)
+    earlier = [pid for pid, _ in index.search(phash) if pid < photo_id]
+    existing = _existing(cursor, earlier)
+    for pid in earlier:
+        if pid not in existing:
+            index.discard(pid)
+    index.add(photo_id, phash)
+    return min(existing) if existing else None
+
+def similar_photos(cursor, group_id, photo_id, radius=DUPLICATE_MAX_DISTANCE):
+    """[(photo_id, distance)] of the group's photos that look like `photo_id`."""
+    cursor.execute("SELECT phash FROM photos WHERE id = %s AND group_id = %s", (photo_id, group_id))
+    row = cursor.fetchone()
+    if not row or row['phash'] is None:
+        return []
+    matches = [(pid, d) for pid, d in get_index(group_id).search(int(row['phash']), radius) if str(pid) != str(photo_id)]
+    existing = _existing(cursor, [pid for pid, _ in matches])
+    return [(pid, d) for pid, d in matches if pid in existing]
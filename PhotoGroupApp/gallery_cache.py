@@ -0,0 +1,102 @@
+import os
+import hashlib
+from authz import TTLCache
+import metrics
+
+# =====================================================
+# GALLERY RESPONSE CACHE
+# =====================================================
+# groups_table.gallery_version changes whenever the photos of a group (or what is
+# shown about them: processing state, uploader name/avatar) change, and
+# users.visibility_version whenever a user hides photos or a block involving them
+# is added or removed. Both are bumped in the same transaction as the change.
+# A serialized /group-photos response is cached under
+#   (group, user, gallery_version, visibility_version, page)
+# so entries never need invalidating: a bump simply makes them unreachable and the
+# LRU drops them. The ETag is derived from the same key, so If-None-Match is
+# answered from two version numbers without reading the photos table.
+
+# Memory per process is bounded by GALLERY_CACHE_MAX_BYTES (sum of cached bodies),
+# whatever the number of entries; least recently used bodies are evicted first.
+GALLERY_CACHE_SIZE = int(os.getenv('GALLERY_CACHE_SIZE', 2000))
+GALLERY_CACHE_TTL = float(os.getenv('GALLERY_CACHE_TTL', 300))
+GALLERY_CACHE_MAX_BYTES = int(os.getenv('GALLERY_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+GALLERY_CACHE_MAX_BODY = int(os.getenv('GALLERY_CACHE_MAX_BODY', 1024 * 1024))  # Larger responses aren't kept
+
+gallery_cache = TTLCache(GALLERY_CACHE_SIZE, GALLERY_CACHE_TTL, max_bytes=GALLERY_CACHE_MAX_BYTES)
+
+# ==========================================
+# VERSION BUMPS (call inside the changing transaction)
+# ==========================================
+def bump_group(cursor, *group_ids):
+    """Photos added, removed or re-rendered in these groups."""
+    group_ids = tuple({str(g) for g in group_ids if g is not None})
+    if not group_ids:
+        return
+    format_strings = ','.join(['%s'] * len(group_ids))
+    cursor.execute(f"UPDATE groups_table SET gallery_version = gallery_version + 1 WHERE id IN ({format_strings})",
+                   group_ids)
+
+def bump_groups_of_photo(cursor, photo_id):
+    """The gallery showing one photo (media job finished or failed)."""
+    cursor.execute("""
+        UPDATE groups_table SET gallery_version = gallery_version + 1
+        WHERE id = (SELECT group_id FROM photos WHERE id = %s)
+    """, (photo_id,))
+
+def bump_groups_of_uploader(cursor, user_id):
+    """Every gallery showing a photo of this user (profile changed, account deleted)."""
+    cursor.execute("""
+        UPDATE groups_table SET gallery_version = gallery_version + 1
+        WHERE id IN (SELECT group_id FROM photos WHERE user_id = %s)
+    """, (user_id,))
+
+def bump_visibility(cursor, *user_ids):
+    """What these users may see changed (hide, block, unblock)."""
+    user_ids = tuple({str(u) for u in user_ids if u is not None})
+    if not user_ids:
+        return
+    format_strings = ','.join(['%s'] * len(user_ids))
+    cursor.execute(f"UPDATE users SET visibility_version = visibility_version + 1 WHERE id IN ({format_strings})",
+                   user_ids)
+
+# ==========================================
+# LOOKUP
+# ==========================================
+def get_versions(cursor, group_id, user_id):
+    """(gallery_version, visibility_version), or None if the group or user doesn't exist."""
+    cursor.execute("""
+        SELECT g.gallery_version, u.visibility_version
+        FROM groups_table g JOIN users u ON u.id = %s
+        WHERE g.id = %s
+    """, (user_id, group_id))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return row['gallery_version'], row['visibility_version']
+
+def cache_key(group_id, user_id, versions, page):
+    """`page` holds everything else the body depends on (host for external URLs, limit, cursor)."""
+    return (str(group_id), str(user_id), versions[0], versions[1], page)
+
+def etag_for(key):
+    return hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+
+def get(key):
+    found, body = gallery_cache.get(key)
+    return body if found else None
+
+def put(key, body):
+    if len(body) <= GALLERY_CACHE_MAX_BODY:
+        gallery_cache.set(key, body)
+
+def _cache_metrics():
+    stats = gallery_cache.stats()
+    return [
+        ("gallery_cache_lookups_total", "counter", "Gallery response cache lookups.",
+         [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])]),
+        ("gallery_cache_entries", "gauge", "Gallery responses currently cached.", [({}, stats["size"])]),
+        ("gallery_cache_bytes", "gauge", "Total size of the cached gallery responses.", [({}, stats["bytes"])])
+    ]
+
+metrics.register_collector(_cache_metrics)
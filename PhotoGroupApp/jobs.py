@@ -0,0 +1,208 @@
+import os
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from db import get_db_connection
+import media
+import metrics
+import storage
+import gallery_cache
+import duplicates
+
+# =====================================================
+# MEDIA JOB QUEUE
+# =====================================================
+# Jobs live in the `media_jobs` table, so they survive restarts and are
+# inserted in the same transaction as the photo row they belong to.
+# A worker thread claims them (SELECT ... FOR UPDATE SKIP LOCKED) and runs
+# the heavy Pillow / OpenCV work in a process pool, off the request path.
+
+JOB_WORKERS = int(os.getenv('MEDIA_JOB_WORKERS', 2))
+JOB_POLL_INTERVAL = float(os.getenv('MEDIA_JOB_POLL_INTERVAL', 2))
+JOB_MAX_ATTEMPTS = int(os.getenv('MEDIA_JOB_MAX_ATTEMPTS', 3))
+JOB_LOCK_TIMEOUT = int(os.getenv('MEDIA_JOB_LOCK_TIMEOUT', 600))  # Reclaim jobs stuck in 'running'
+
+# Columns a job handler is allowed to write back to the photos table
+PHOTO_RESULT_COLUMNS = {
+    # video_job
+    'duration_ms', 'width', 'height', 'fps', 'rotation', 'video_codec', 'sprite_frames',
+    # thumbnail_job / video_job (duplicate_of is filled in by complete_job from the phash)
+    'phash', 'duplicate_of',
+    # thumbnail_job / metadata_job (EXIF)
+    'taken_at', 'camera_make', 'camera_model', 'orientation', 'latitude', 'longitude'
+}
+
+_wakeup = threading.Event()
+_worker = None
+
+def enqueue_job(cursor, photo_id, job_type='thumbnail'):
+    """Queues a job for a photo. The caller commits it together with the photo row."""
+    cursor.execute("INSERT INTO media_jobs (photo_id, job_type) VALUES (%s, %s)", (photo_id, job_type))
+
+def enqueue_jobs(cursor, items):
+    """enqueue_job() for a batch of (photo_id, job_type)."""
+    cursor.executemany("INSERT INTO media_jobs (photo_id, job_type) VALUES (%s, %s)", items)
+
+def wake_worker():
+    """Lets an in-process worker pick up freshly committed jobs without waiting for the next poll."""
+    _wakeup.set()
+
+def run_job(job_type, file_path, filename):
+    """Entry point executed inside the process pool. Returns (photo updates, handler seconds)."""
+    started = time.perf_counter()
+    updates = media.JOB_HANDLERS[job_type](file_path, filename)
+    return updates, time.perf_counter() - started
+
+
+class MediaWorker(threading.Thread):
+    def __init__(self, upload_folder, workers=JOB_WORKERS, poll_interval=JOB_POLL_INTERVAL):
+        super().__init__(name='media-worker', daemon=True)
+        self.upload_folder = upload_folder
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        _wakeup.set()
+
+    def run(self):
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            while not self._stop_event.is_set():
+                try:
+                    jobs = self.claim_jobs(self.workers)
+                except Exception as e:
+                    print(f"Media job claim error: {e}")
+                    jobs = []
+
+                if not jobs:
+                    _wakeup.wait(self.poll_interval)
+                    _wakeup.clear()
+                    continue
+
+                futures = []
+                for job in jobs:
+                    file_path = os.path.join(self.upload_folder, job['file_name'])
+                    futures.append((job, pool.submit(run_job, job['job_type'], file_path, job['file_name'])))
+
+                for job, future in futures:
+                    try:
+                        updates, seconds = future.result()
+                        metrics.MEDIA_JOB_SECONDS.observe(seconds, (job['job_type'],))
+                        # Measured in the pool process, recorded here where /metrics can see it
+                        thumbnail_seconds = (updates or {}).pop('thumbnail_seconds', None)
+                        if thumbnail_seconds is not None:
+                            metrics.THUMBNAIL_SECONDS.observe(thumbnail_seconds)
+                        self.complete_job(job, updates)
+                        metrics.MEDIA_JOBS.inc((job['job_type'], 'done'))
+                    except Exception as e:
+                        metrics.MEDIA_JOBS.inc((job['job_type'], 'error'))
+                        self.fail_job(job, e)
+
+    def claim_jobs(self, limit):
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("""
+                SELECT j.id, j.photo_id, j.job_type, j.attempts, p.file_name, p.group_id
+                FROM media_jobs j
+                JOIN photos p ON p.id = j.photo_id
+                WHERE (j.status = 'pending' AND j.run_after <= NOW())
+                   OR (j.status = 'running' AND j.locked_at < NOW() - INTERVAL %s SECOND)
+                ORDER BY j.id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (JOB_LOCK_TIMEOUT, limit))
+            jobs = cursor.fetchall()
+
+            if jobs:
+                format_strings = ','.join(['%s'] * len(jobs))
+                cursor.execute(f"""
+                    UPDATE media_jobs SET status = 'running', attempts = attempts + 1, locked_at = NOW()
+                    WHERE id IN ({format_strings})
+                """, tuple(j['id'] for j in jobs))
+                # A photo that is already ready stays visible while backfill jobs run on it
+                cursor.execute(f"""
+                    UPDATE photos SET processing_status = 'processing'
+                    WHERE id IN ({format_strings}) AND processing_status <> 'ready'
+                """, tuple(j['photo_id'] for j in jobs))
+            conn.commit()
+            return jobs
+        finally:
+            cursor.close(); conn.close()
+
+    def complete_job(self, job, updates):
+        updates = {k: v for k, v in (updates or {}).items() if k in PHOTO_RESULT_COLUMNS}
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            if updates.get('phash') is not None:
+                # Upload-time near-duplicate check against the rest of the group
+                try:
+                    updates['duplicate_of'] = duplicates.find_original(cursor, job['group_id'], job['photo_id'], updates['phash'])
+                except Exception as e:
+                    print(f"Duplicate check failed for photo {job['photo_id']}: {e}")
+
+            cursor.execute("UPDATE media_jobs SET status = 'done', locked_at = NULL WHERE id = %s", (job['id'],))
+
+            # Photo is only 'ready' once no other job for it is still outstanding
+            set_sql = ''.join(f", {col} = %s" for col in updates)
+            cursor.execute(f"""
+                UPDATE photos SET processing_status = IF(
+                    processing_status <> 'ready'
+                    AND EXISTS (SELECT 1 FROM media_jobs WHERE photo_id = %s AND status IN ('pending', 'running')),
+                    'processing', 'ready'){set_sql}
+                WHERE id = %s
+            """, (job['photo_id'], *updates.values(), job['photo_id']))
+            gallery_cache.bump_groups_of_photo(cursor, job['photo_id'])
+            conn.commit()
+        finally:
+            cursor.close(); conn.close()
+
+    def fail_job(self, job, error):
+        print(f"Media job {job['id']} ({job['job_type']}) failed: {error}")
+        attempts = job['attempts'] + 1
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            if attempts < JOB_MAX_ATTEMPTS:
+                # Retry with exponential backoff
+                cursor.execute("""
+                    UPDATE media_jobs SET status = 'pending', locked_at = NULL, last_error = %s,
+                           run_after = NOW() + INTERVAL %s SECOND
+                    WHERE id = %s
+                """, (str(error)[:255], 2 ** attempts * 5, job['id']))
+                cursor.execute("UPDATE photos SET processing_status = 'pending' WHERE id = %s AND processing_status <> 'ready'",
+                               (job['photo_id'],))
+            else:
+                cursor.execute("UPDATE media_jobs SET status = 'failed', locked_at = NULL, last_error = %s WHERE id = %s",
+                               (str(error)[:255], job['id']))
+                cursor.execute("UPDATE photos SET processing_status = 'failed' WHERE id = %s AND processing_status <> 'ready'",
+                               (job['photo_id'],))
+                gallery_cache.bump_groups_of_photo(cursor, job['photo_id'])
+            conn.commit()
+        finally:
+            cursor.close(); conn.close()
+
+
+def start_worker(upload_folder, **kwargs):
+    """Starts the in-process media worker (used by the development server)."""
+    global _worker
+    if _worker is None:
+        _worker = MediaWorker(upload_folder, **kwargs)
+        _worker.start()
+    return _worker
+
+
+if __name__ == '__main__':
+    # Standalone worker + file collector: python jobs.py (run next to the WSGI server in production)
+    upload_folder = os.path.join(os.getcwd(), 'uploads')
+    worker = MediaWorker(upload_folder)
+    worker.start()
+    collector = storage.start_collector(upload_folder)
+    try:
+        while worker.is_alive():
+            worker.join(1)
+    except KeyboardInterrupt:
+        worker.stop()
+        collector.stop()
@@ -0,0 +1,578 @@
+import os
+import re
+import time
+import mimetypes
+import threading
+from flask import request, jsonify, send_from_directory, current_app, abort
+from werkzeug.security import safe_join
+from datetime import datetime, timedelta
+from PIL import Image, ImageOps, ImageStat, ExifTags
+import numpy as np
+import cv2
+import metrics
+
+VIDEO_EXTENSIONS = {'mp4', 'mov', 'avi', 'm4v'}
+
+def is_video_file(filename):
+    return filename.rsplit('.', 1)[1].lower() in VIDEO_EXTENSIONS
+
+def thumb_name(filename):
+    """thumb_<name> next to the original; works for flat names and sharded storage keys (ab/cd/<hash>.jpg)."""
+    folder, base = os.path.split(filename)
+    return f"{folder}/thumb_{base}" if folder else f"thumb_{base}"
+
+def sprite_name(filename):
+    """sprite_<name>.jpg next to a video: its scrubbing preview strip."""
+    folder, base = os.path.split(filename)
+    return f"{folder}/sprite_{base}.jpg" if folder else f"sprite_{base}.jpg"
+
+# =====================================================
+# RENDITION LADDER
+# =====================================================
+# name -> bounding box in pixels. 'original' always means the untouched upload.
+# Override with e.g. RENDITION_SIZES="thumb:300,avatar:150,screen:1280"
+def _parse_ladder(value):
+    ladder = {}
+    for item in value.split(','):
+        name, px = item.split(':')
+        ladder[name.strip()] = (int(px), int(px))
+    return ladder
+
+RENDITIONS = _parse_ladder(os.getenv('RENDITION_SIZES', 'thumb:300,avatar:150,screen:1280'))
+RENDITION_QUALITY = int(os.getenv('RENDITION_QUALITY', 80))
+RENDITION_DIR = '.renditions'
+
+# format -> (Pillow format, mimetype, extension)
+RENDITION_FORMATS = {
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg')
+}
+
+# Striped locks so two requests for the same missing rendition only render it once
+_render_locks = [threading.Lock() for _ in range(64)]
+
+# =====================================================
+# BOUNDED-MEMORY DECODING
+# =====================================================
+# Renditions never need the full-resolution bitmap. With a target box, a JPEG is
+# decoded at 1/2, 1/4 or 1/8 scale straight from the DCT data (draft mode) and
+# other formats are reduced right after decoding, both down to DECODE_GAP x the
+# box, before EXIF rotation and the final high-quality resize. Images with more
+# than IMAGE_MAX_PIXELS pixels are refused from their header, before any decoding.
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 120_000_000))
+DECODE_GAP = 2
+
+# Also guards every other Image.open in the process (Pillow raises at twice this)
+Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+
+def open_image(file_path, box=None):
+    """
+    Decodes an image upload, EXIF-rotated and in RGB or L. With `box`, it is only
+    decoded to about DECODE_GAP times the size needed to fit it. The file is closed on return.
+    """
+    with Image.open(file_path) as img:
+        if img.width * img.height > IMAGE_MAX_PIXELS:
+            raise Image.DecompressionBombError(
+                f"{img.width}x{img.height} image exceeds IMAGE_MAX_PIXELS ({IMAGE_MAX_PIXELS})")
+        if box:
+            side = max(box) * DECODE_GAP
+            # Uses draft() + reduce() since nothing has been decoded yet
+            img.thumbnail((side, side))
+        else:
+            img.load()
+        rotated = ImageOps.exif_transpose(img)
+
+    if rotated.mode not in ('RGB', 'L'):
+        rotated = rotated.convert('RGB')
+    return rotated
+
+def load_source_image(file_path, filename, box=None):
+    """Returns an RGB PIL image of an upload (EXIF-rotated) or of a video's poster frame, or None."""
+    if is_video_file(filename):
+        cam = cv2.VideoCapture(file_path)
+        try:
+            return pick_poster_frame(cam, probe_video(cam)['duration_ms'])
+        finally:
+            cam.release()
+
+    return open_image(file_path, box)
+
+def save_rendition(img, box, pil_format, dest_path, quality=RENDITION_QUALITY):
+    """Shrinks `img` to fit `box` and writes it atomically to `dest_path`."""
+    img = img.copy()
+    img.thumbnail(box)
+    tmp_path = f"{dest_path}.{threading.get_ident()}.tmp"
+    img.save(tmp_path, pil_format, quality=quality)
+    os.replace(tmp_path, dest_path)
+
+# =====================================================
+# VIDEO ANALYSIS
+# =====================================================
+# Frames are fetched one at a time by seeking and grab()/retrieve(), and each is
+# shrunk right away, so memory stays at a few frames whatever the video's length.
+POSTER_PROBES = (0.1, 0.25, 0.5, 0.75, 0.05)  # Share of the duration tried, in order
+POSTER_MIN_BRIGHTNESS = 24                    # Mean luma (0-255) below this = black frame
+POSTER_MIN_CONTRAST = 12                      # Luma std-dev below this = blank frame (fades, solid cards)
+SPRITE_FRAMES = int(os.getenv('VIDEO_SPRITE_FRAMES', 10))
+SPRITE_TILE_WIDTH = int(os.getenv('VIDEO_SPRITE_TILE_WIDTH', 160))
+FRAME_MAX_SIDE = max(box[0] for box in RENDITIONS.values())
+VIDEO_MAX_FPS = 1000                 # Above this CAP_PROP_FPS is not a frame rate: stored as NULL
+VIDEO_MAX_DURATION_MS = 2 ** 31 - 1  # photos.duration_ms is an INT
+
+def _fourcc(value):
+    code = int(value)
+    return ''.join(chr((code >> 8 * i) & 0xFF) for i in range(4)).strip('\x00 ') or None
+
+def probe_video(cam):
+    """Container metadata of an opened cv2.VideoCapture. Width/height are as displayed (after rotation)."""
+    fps = cam.get(cv2.CAP_PROP_FPS) or 0
+    # Some containers report their time base (tens of thousands) or garbage as the frame
+    # rate; it would overflow photos.fps and make the duration meaningless
+    if not 0 < fps <= VIDEO_MAX_FPS:
+        fps = 0
+    frame_count = cam.get(cv2.CAP_PROP_FRAME_COUNT) or 0
+    width = int(cam.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cam.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    # Phone videos are stored sideways with a rotation tag (OpenCV 4.5+ reports it)
+    rotation = 0
+    if hasattr(cv2, 'CAP_PROP_ORIENTATION_META'):
+        rotation = int(cam.get(cv2.CAP_PROP_ORIENTATION_META)) % 360
+    if rotation in (90, 270):
+        width, height = height, width
+
+    duration_ms = int(frame_count * 1000 / fps) if fps > 0 and frame_count > 0 else None
+    if duration_ms is not None and duration_ms > VIDEO_MAX_DURATION_MS:
+        duration_ms = None
+
+    return {
+        "duration_ms": duration_ms,
+        "width": width or None,
+        "height": height or None,
+        "fps": round(fps, 3) or None,
+        "rotation": rotation,
+        "video_codec": _fourcc(cam.get(cv2.CAP_PROP_FOURCC))
+    }
+
+def read_frame_at(cam, position_ms, max_side=FRAME_MAX_SIDE):
+    """The frame at `position_ms` as an RGB PIL image no larger than `max_side`, or None past the end."""
+    cam.set(cv2.CAP_PROP_POS_MSEC, position_ms)
+    if not cam.grab():
+        return None
+    ok, frame = cam.retrieve()
+    if not ok:
+        return None
+    h, w = frame.shape[:2]
+    scale = max_side / max(h, w)
+    if scale < 1:
+        frame = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+def frame_score(img):
+    """(mean brightness, contrast) of a frame, measured on a tiny grayscale copy."""
+    small = img.convert('L')
+    small.thumbnail((64, 64))
+    stat = ImageStat.Stat(small)
+    return stat.mean[0], stat.stddev[0]
+
+def pick_poster_frame(cam, duration_ms):
+    """
+    First probed frame that is neither dark nor blank; if none qualifies, the most
+    detailed one seen. Falls back to the first seconds when the duration is unknown.
+    """
+    if duration_ms:
+        positions = [duration_ms * share for share in POSTER_PROBES]
+    else:
+        positions = [1000, 3000, 0]
+
+    best, best_score = None, -1
+    for position in positions:
+        img = read_frame_at(cam, position)
+        if img is None:
+            continue
+        brightness, contrast = frame_score(img)
+        if brightness >= POSTER_MIN_BRIGHTNESS and contrast >= POSTER_MIN_CONTRAST:
+            return img
+        if brightness + contrast > best_score:
+            best, best_score = img, brightness + contrast
+    return best
+
+def render_sprite(cam, duration_ms, dest_path, frames=SPRITE_FRAMES, tile_width=SPRITE_TILE_WIDTH):
+    """
+    Writes a horizontal strip of `frames` evenly spaced tiles to `dest_path` (JPEG).
+    Tile i shows the middle of the i-th slice of the video. Returns the tile count, 0 on failure.
+    """
+    sprite = None
+    for i in range(frames):
+        # Twice the tile width so portrait frames are still downscaled into their tile
+        img = read_frame_at(cam, duration_ms * (i + 0.5) / frames, max_side=tile_width * 2)
+        if img is None:
+            continue
+        if sprite is None:
+            tile_height = round(tile_width * img.height / img.width)
+            sprite = Image.new('RGB', (tile_width * frames, tile_height))
+        if img.size != (tile_width, sprite.height):
+            img = img.resize((tile_width, sprite.height))
+        sprite.paste(img, (i * tile_width, 0))
+
+    if sprite is None:
+        return 0
+    tmp_path = f"{dest_path}.{threading.get_ident()}.tmp"
+    sprite.save(tmp_path, "JPEG", quality=70)
+    os.replace(tmp_path, dest_path)
+    return frames
+
+# ==========================================
+# HELPER: CREATE THUMBNAIL
+# ==========================================
+# Grid thumbnails are still written as thumb_<filename> (JPEG) because the
+# list endpoints hand out those URLs directly.
+def create_thumbnail(file_path, filename, observe=True):
+    """
+    Renders thumb_<filename>. observe=False leaves thumbnail_duration_seconds to the caller:
+    inside the media job process pool it would be recorded in a child process's metrics.
+    """
+    started = time.perf_counter()
+    try:
+        img = load_source_image(file_path, filename, RENDITIONS['thumb'])
+
+        if img:
+            thumb_filename = thumb_name(filename)
+            thumb_path = os.path.join(os.path.dirname(file_path), os.path.basename(thumb_filename))
+            save_rendition(img, RENDITIONS['thumb'], "JPEG", thumb_path, quality=85)
+            if observe:
+                metrics.THUMBNAIL_SECONDS.observe(time.perf_counter() - started)
+            print(f"Thumbnail created: {thumb_filename}")
+            return thumb_filename
+        else:
+            print("Failed to load image or video frame")
+            return None
+
+    except Exception as e:
+        print(f"Thumbnail creation failed: {e}")
+        return None
+
+# ==========================================
+# PHOTO METADATA (EXIF)
+# ==========================================
+# Read from the header only (no pixels are decoded) while the upload is ingested.
+# Only the fields the file actually has are returned, so a photo without a capture
+# time keeps taken_at = upload_date. EXIF times are wall-clock; they are converted
+# to UTC when the camera recorded an offset (OffsetTimeOriginal) and used as-is otherwise.
+EXIF_TIME_FORMAT = '%Y:%m:%d %H:%M:%S'
+EXIF_MIN_YEAR = 1990   # Older "capture times" are unset camera clocks
+
+def _exif_text(value, max_len=64):
+    if isinstance(value, bytes):
+        value = value.decode(errors='ignore')
+    value = str(value or '').replace('\x00', '').strip()
+    return value[:max_len] or None
+
+def _exif_datetime(value, offset=None):
+    value = _exif_text(value, 19)
+    try:
+        taken = datetime.strptime(value, EXIF_TIME_FORMAT)
+    except (TypeError, ValueError):
+        return None
+    offset = _exif_text(offset, 6)
+    if offset and len(offset) == 6 and offset[0] in '+-':
+        try:
+            delta = timedelta(hours=int(offset[1:3]), minutes=int(offset[4:6]))
+            taken = taken - delta if offset[0] == '+' else taken + delta
+        except ValueError:
+            pass
+    if taken.year < EXIF_MIN_YEAR or taken > datetime.utcnow() + timedelta(days=1):
+        return None
+    return taken
+
+def _gps_degrees(dms, ref):
+    try:
+        degrees = float(dms[0]) + float(dms[1]) / 60 + float(dms[2]) / 3600
+    except (TypeError, ValueError, IndexError, ZeroDivisionError):
+        return None
+    if _exif_text(ref, 1) in ('S', 'W'):
+        degrees = -degrees
+    return round(degrees, 6)
+
+def read_metadata(file_path):
+    """
+    Photo columns from an image's header: width, height (as displayed), orientation,
+    taken_at, camera_make, camera_model, latitude, longitude. Unreadable EXIF yields {}.
+    """
+    try:
+        with Image.open(file_path) as img:
+            exif = img.getexif()
+            width, height = img.size
+            sub = exif.get_ifd(ExifTags.IFD.Exif)
+            gps = exif.get_ifd(ExifTags.IFD.GPSInfo)
+    except Exception as e:
+        print(f"Could not read metadata of {file_path}: {e}")
+        return {}
+
+    orientation = exif.get(ExifTags.Base.Orientation)
+    orientation = orientation if orientation in range(1, 9) else None
+    if orientation in (5, 6, 7, 8):
+        width, height = height, width
+
+    taken_at = (_exif_datetime(sub.get(ExifTags.Base.DateTimeOriginal), sub.get(ExifTags.Base.OffsetTimeOriginal))
+                or _exif_datetime(sub.get(ExifTags.Base.DateTimeDigitized), sub.get(ExifTags.Base.OffsetTimeDigitized))
+                or _exif_datetime(exif.get(ExifTags.Base.DateTime), sub.get(ExifTags.Base.OffsetTime)))
+
+    latitude = longitude = None
+    if ExifTags.GPS.GPSLatitude in gps and ExifTags.GPS.GPSLongitude in gps:
+        latitude = _gps_degrees(gps[ExifTags.GPS.GPSLatitude], gps.get(ExifTags.GPS.GPSLatitudeRef))
+        longitude = _gps_degrees(gps[ExifTags.GPS.GPSLongitude], gps.get(ExifTags.GPS.GPSLongitudeRef))
+        if latitude is None or longitude is None or abs(latitude) > 90 or abs(longitude) > 180 \
+                or (latitude == 0 and longitude == 0):
+            latitude = longitude = None
+
+    meta = {
+        'width': width,
+        'height': height,
+        'orientation': orientation,
+        'taken_at': taken_at,
+        'camera_make': _exif_text(exif.get(ExifTags.Base.Make)),
+        'camera_model': _exif_text(exif.get(ExifTags.Base.Model)),
+        'latitude': latitude,
+        'longitude': longitude
+    }
+    return {k: v for k, v in meta.items() if v is not None}
+
+# ==========================================
+# PERCEPTUAL HASH
+# ==========================================
+# 64-bit pHash: low frequencies of the DCT of a 32x32 grayscale copy, one bit per
+# coefficient (above / below their median). Recompression, resizing and small
+# colour changes (a photo forwarded through a chat app) flip only a few bits.
+# Computed from the grid thumbnail, which the media job has already decoded and downscaled.
+PHASH_SIZE = 32
+PHASH_LOW = 8
+
+def _dct_matrix(n):
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return matrix * np.sqrt(2 / n)
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+def perceptual_hash(img):
+    """64-bit perceptual hash of a PIL image, as an unsigned int."""
+    gray = np.asarray(img.convert('L').resize((PHASH_SIZE, PHASH_SIZE), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT @ gray @ _DCT.T)[:PHASH_LOW, :PHASH_LOW].flatten()
+    # The DC term is the mean brightness, not structure: leave it out of the median
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hash_thumbnail(thumb_path):
+    with Image.open(thumb_path) as img:
+        return perceptual_hash(img)
+
+# ==========================================
+# LAZY RENDITIONS (ON-DISK CACHE)
+# ==========================================
+def get_rendition(upload_folder, filename, size, fmt):
+    """
+    Returns the path (relative to upload_folder) of `filename` rendered at `size` in `fmt`,
+    generating and caching it on first use. Returns None if the source can't be rendered.
+    """
+    source_path = safe_join(upload_folder, filename)
+    if source_path is None or not os.path.isfile(source_path):
+        return None
+
+    rel_path = os.path.join(RENDITION_DIR, size, f"{filename}.{RENDITION_FORMATS[fmt][2]}")
+    dest_path = os.path.join(upload_folder, rel_path)
+
+    if os.path.exists(dest_path):
+        return rel_path
+
+    with _render_locks[hash(dest_path) % len(_render_locks)]:
+        if os.path.exists(dest_path):
+            return rel_path
+        try:
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            img = load_source_image(source_path, filename, RENDITIONS[size])
+            if img is None:
+                return None
+            save_rendition(img, RENDITIONS[size], RENDITION_FORMATS[fmt][0], dest_path)
+        except Exception as e:
+            print(f"Rendition error ({size}/{fmt}) for {filename}: {e}")
+            return None
+
+    return rel_path
+
+def media_file_paths(upload_folder, filename):
+    """Every file on disk that belongs to an upload: the original, its thumbnail and all cached renditions."""
+    paths = [os.path.join(upload_folder, filename), os.path.join(upload_folder, thumb_name(filename))]
+    if is_video_file(filename):
+        paths.append(os.path.join(upload_folder, sprite_name(filename)))
+    for size in RENDITIONS:
+        for fmt in RENDITION_FORMATS.values():
+            paths.append(os.path.join(upload_folder, RENDITION_DIR, size, f"{filename}.{fmt[2]}"))
+    return paths
+
+def negotiate_format():
+    """Explicit ?format= wins, otherwise WebP when the client accepts it, else JPEG."""
+    fmt = request.args.get('format')
+    if fmt in RENDITION_FORMATS:
+        return fmt
+    if request.accept_mimetypes['image/webp']:
+        return 'webp'
+    return 'jpeg'
+
+# =====================================================
+# MEDIA DELIVERY
+# =====================================================
+# MEDIA_SENDFILE="x-accel": Python only authorizes, nginx streams the file from
+#   an `internal` location mapped to MEDIA_ACCEL_PREFIX (it also handles Range).
+# MEDIA_SENDFILE="x-sendfile": same for Apache/lighttpd via X-Sendfile (Flask USE_X_SENDFILE).
+# Otherwise Flask streams the file itself, with ETag / If-None-Match and Range support.
+MEDIA_SENDFILE = os.getenv('MEDIA_SENDFILE', '').lower()
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-uploads/')
+IMMUTABLE_MAX_AGE = 31536000  # 1 year
+
+# Content-addressed files and their derivatives: ab/cd/[thumb_|sprite_]<sha256>.<ext>[.<fmt>],
+# optionally under .renditions/<size>/. Their bytes can never change for a given path.
+CONTENT_ADDRESSED_RE = re.compile(
+    r'^(?:\.renditions/(?P<size>\w+)/)?[0-9a-f]{2}/[0-9a-f]{2}/(?:(?P<kind>thumb|sprite)_)?(?P<hash>[0-9a-f]{64})\.\w+(?:\.(?P<fmt>\w+))?$'
+)
+
+def content_etag(rel_path):
+    """Strong ETag derived from the content hash, or None for files that may be overwritten."""
+    match = CONTENT_ADDRESSED_RE.match(rel_path.replace(os.sep, '/'))
+    if not match:
+        return None
+    parts = [match.group('hash')]
+    if match.group('kind'):
+        parts.append(match.group('kind'))
+    if match.group('size'):
+        parts += [match.group('size'), match.group('fmt')]
+    return '-'.join(parts)
+
+def send_media(upload_folder, rel_path, mimetype=None):
+    """Sends a file from the upload folder with caching headers (and proxy offload if configured)."""
+    etag = content_etag(rel_path)
+    max_age = IMMUTABLE_MAX_AGE if etag else None
+
+    if MEDIA_SENDFILE == 'x-accel':
+        path = safe_join(upload_folder, rel_path)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        response = current_app.response_class()
+        response.headers['X-Accel-Redirect'] = MEDIA_ACCEL_PREFIX + rel_path.replace(os.sep, '/')
+        response.mimetype = mimetype or mimetypes.guess_type(rel_path)[0] or 'application/octet-stream'
+        if etag:
+            response.set_etag(etag)
+        else:
+            stat = os.stat(path)
+            response.set_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+            response.last_modified = stat.st_mtime
+        # Answers 304 here; nginx handles 200 / 206 itself
+        response.make_conditional(request)
+    else:
+        response = send_from_directory(upload_folder, rel_path, mimetype=mimetype, etag=etag or True, max_age=max_age)
+
+    if etag:
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+def serve_upload(filename):
+    """
+    Serves /uploads/<filename>. Without ?size= (or with size=original) the original file is sent;
+    otherwise the matching rendition in the negotiated format.
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    size = request.args.get('size')
+
+    # Internal folders (.partial, .tmp, .renditions) are never served directly
+    if any(part.startswith('.') for part in filename.split('/')):
+        abort(404)
+
+    if not size or size == 'original':
+        return send_media(upload_folder, filename)
+
+    if size not in RENDITIONS:
+        return jsonify({"error": f"Unknown size. Use one of: {', '.join(list(RENDITIONS) + ['original'])}"}), 400
+
+    fmt = negotiate_format()
+    rel_path = get_rendition(upload_folder, filename, size, fmt)
+    if rel_path is None:
+        abort(404)
+
+    response = send_media(upload_folder, rel_path, mimetype=RENDITION_FORMATS[fmt][1])
+    response.vary.add('Accept')
+    return response
+
+# ==========================================
+# BACKGROUND JOB HANDLERS
+# ==========================================
+# Each handler runs inside the worker's process pool and returns a dict of
+# photo columns to update. Raising marks the job as failed (and retried).
+# Metrics recorded in the pool would stay in the child process, so a handler that
+# rendered a thumbnail also returns 'thumbnail_seconds' for MediaWorker to observe.
+def thumbnail_job(file_path, filename):
+    thumb_path = os.path.join(os.path.dirname(file_path), os.path.basename(thumb_name(filename)))
+    updates = {}
+    # Deduplicated uploads share the thumbnail of the first copy
+    if not os.path.exists(thumb_path):
+        started = time.perf_counter()
+        if not create_thumbnail(file_path, filename, observe=False):
+            raise RuntimeError(f"Could not create thumbnail for {filename}")
+        updates['thumbnail_seconds'] = time.perf_counter() - started
+    return {**updates, 'phash': hash_thumbnail(thumb_path), **read_metadata(file_path)}
+
+def metadata_job(file_path, filename):
+    """EXIF only (backfill of photos ingested before metadata was extracted). Never fails the photo."""
+    if is_video_file(filename):
+        return {}
+    return read_metadata(file_path)
+
+def video_job(file_path, filename, regenerate_poster=False):
+    """
+    Poster-frame thumbnail, container metadata and scrubbing sprite, from one pass of seeks.
+    An existing thumbnail is kept (deduplicated uploads share it) unless regenerate_poster is set.
+    """
+    folder = os.path.dirname(file_path)
+    thumb_path = os.path.join(folder, os.path.basename(thumb_name(filename)))
+    sprite_path = os.path.join(folder, os.path.basename(sprite_name(filename)))
+
+    cam = cv2.VideoCapture(file_path)
+    try:
+        if not cam.isOpened():
+            raise RuntimeError(f"Could not open video {filename}")
+        meta = probe_video(cam)
+
+        if regenerate_poster or not os.path.exists(thumb_path):
+            started = time.perf_counter()
+            poster = pick_poster_frame(cam, meta['duration_ms'])
+            if poster is None:
+                raise RuntimeError(f"No decodable frame in {filename}")
+            save_rendition(poster, RENDITIONS['thumb'], "JPEG", thumb_path, quality=85)
+            meta['thumbnail_seconds'] = time.perf_counter() - started
+
+        sprite_frames = 0
+        if meta['duration_ms']:
+            # Deduplicated uploads share the sprite of the first copy
+            if os.path.exists(sprite_path):
+                sprite_frames = SPRITE_FRAMES
+            else:
+                sprite_frames = render_sprite(cam, meta['duration_ms'], sprite_path)
+    finally:
+        cam.release()
+
+    meta['sprite_frames'] = sprite_frames
+    meta['phash'] = hash_thumbnail(thumb_path)
+    return meta
+
+def video_backfill_job(file_path, filename):
+    """video_job for videos processed before poster frames: replaces their first-frame thumbnail."""
+    return video_job(file_path, filename, regenerate_poster=True)
+
+JOB_HANDLERS = {
+    'thumbnail': thumbnail_job,
+    'video': video_job,
+    'video_backfill': video_backfill_job,
+    'metadata': metadata_job
+}
@@ -0,0 +1,241 @@
+import time
+import bisect
+import threading
+from flask import request, g, has_request_context
+
+# =====================================================
+# METRICS (PROMETHEUS TEXT FORMAT)
+# =====================================================
+# Every thread writes only to its own shard, so recording a value takes no lock.
+# A scrape sums the shards; shards of finished threads are folded into a
+# "retired" total (on scrape, and every RETIRE_EVERY new shards so the list
+# stays bounded on thread-per-request servers that are never scraped).
+# Media jobs run in worker processes: their handler timings only show up here
+# when the worker thread lives in the web process (development server).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+JOB_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RETIRE_EVERY = 64
+
+
+class _Shards:
+    def __init__(self):
+        self._local = threading.local()
+        self._live = []      # [(thread, {labels: [values]})]
+        self._retired = {}
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def mine(self):
+        values = getattr(self._local, 'values', None)
+        if values is None:
+            values = self._local.values = {}
+            with self._lock:
+                self._live.append((threading.current_thread(), values))
+                self._created += 1
+                if self._created % RETIRE_EVERY == 0:
+                    self._retire_dead()
+        return values
+
+    def _retire_dead(self):
+        """Folds the shards of finished threads into the retired total. Caller holds the lock."""
+        live = []
+        for thread, values in self._live:
+            if thread.is_alive():
+                live.append((thread, values))
+            else:
+                self._add(self._retired, values)
+        self._live = live
+
+    @staticmethod
+    def _add(total, values):
+        for labels, v in list(values.items()):
+            acc = total.get(labels)
+            if acc is None:
+                total[labels] = list(v)
+            else:
+                for i, x in enumerate(v):
+                    acc[i] += x
+
+    def snapshot(self):
+        with self._lock:
+            self._retire_dead()
+            total = {labels: list(v) for labels, v in self._retired.items()}
+            for _, values in self._live:
+                self._add(total, values)
+        return total
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._shards = _Shards()
+        _registry.append(self)
+
+    def _slot(self, labels, size):
+        values = self._shards.mine()
+        slot = values.get(labels)
+        if slot is None:
+            slot = values[labels] = [0] * size
+        return slot
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        self._slot(labels, 1)[0] += amount
+
+    def render(self):
+        for labels, v in sorted(self._shards.snapshot().items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_num(v[0])}"
+
+
+class Gauge(Counter):
+    """Up/down value summed over threads (e.g. requests in flight)."""
+    kind = 'gauge'
+
+    def dec(self, labels=(), amount=1):
+        self._slot(labels, 1)[0] -= amount
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        # [count per bucket..., +Inf, sum, count]
+        slot = self._slot(labels, len(self.buckets) + 3)
+        slot[bisect.bisect_left(self.buckets, value)] += 1
+        slot[-2] += value
+        slot[-1] += 1
+
+    def render(self):
+        for labels, v in sorted(self._shards.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), v):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _num(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + (le,))} {_num(cumulative)}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(v[-2])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {_num(v[-1])}"
+
+
+_registry = []
+_collectors = []
+
+def register_collector(fn):
+    """
+    fn() -> [(name, type, help, [(labels_dict, value), ...]), ...], evaluated on every scrape.
+    For values that already live elsewhere (pool stats, cache stats, push dispatcher).
+    """
+    _collectors.append(fn)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + '}'
+
+def _num(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def render():
+    """All metrics in Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            families = collector()
+        except Exception as e:
+            print(f"Metrics collector error: {e}")
+            continue
+        for name, kind, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_num(value)}")
+    return '\n'.join(lines) + '\n'
+
+# ==========================================
+# METRIC DEFINITIONS
+# ==========================================
+HTTP_REQUESTS = Counter('http_requests_total', 'HTTP requests by route and status.',
+                        ('blueprint', 'endpoint', 'method', 'status'))
+HTTP_LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency.',
+                         ('blueprint', 'endpoint', 'method'))
+HTTP_IN_FLIGHT = Gauge('http_requests_in_flight', 'Requests currently being handled.')
+REQUEST_DB_QUERIES = Histogram('http_request_db_queries', 'DB queries executed per request.',
+                               ('endpoint',), COUNT_BUCKETS)
+REQUEST_DB_SECONDS = Histogram('http_request_db_seconds', 'Time spent in DB queries per request.', ('endpoint',))
+DB_QUERY_SECONDS = Histogram('db_query_duration_seconds', 'Duration of single DB statements (all callers).')
+UPLOAD_BYTES = Counter('upload_bytes_total', 'Bytes received by upload endpoints.', ('source',))
+UPLOADS = Counter('uploads_total', 'Uploads registered.', ('media_type',))
+THUMBNAIL_SECONDS = Histogram('thumbnail_duration_seconds', 'Time to render one grid thumbnail.', (), JOB_BUCKETS)
+MEDIA_JOB_SECONDS = Histogram('media_job_duration_seconds', 'Media job handler run time.', ('job_type',), JOB_BUCKETS)
+MEDIA_JOBS = Counter('media_jobs_total', 'Media jobs finished.', ('job_type', 'result'))
+FILE_GC_FILES = Counter('file_gc_files_removed_total', 'Media files removed by the file collector.')
+
+# ==========================================
+# HOOKS
+# ==========================================
+def observe_query(seconds):
+    """Called by the DB cursor wrapper after every statement."""
+    DB_QUERY_SECONDS.observe(seconds)
+    if has_request_context():
+        g.metrics_db_queries = g.get('metrics_db_queries', 0) + 1
+        g.metrics_db_seconds = g.get('metrics_db_seconds', 0.0) + seconds
+
+def _route_labels():
+    endpoint = request.endpoint or 'unmatched'
+    return (request.blueprint or 'app', endpoint, request.method)
+
+def _record(status):
+    blueprint, endpoint, method = _route_labels()
+    HTTP_LATENCY.observe(time.perf_counter() - g.metrics_started, (blueprint, endpoint, method))
+    HTTP_REQUESTS.inc((blueprint, endpoint, method, str(status)))
+    REQUEST_DB_QUERIES.observe(g.get('metrics_db_queries', 0), (endpoint,))
+    REQUEST_DB_SECONDS.observe(g.get('metrics_db_seconds', 0.0), (endpoint,))
+    g.metrics_recorded = True
+
+def init_app(app):
+    """Registers the request instrumentation hooks."""
+
+    @app.before_request
+    def _start_request():
+        g.metrics_started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+
+    @app.after_request
+    def _finish_request(response):
+        if 'metrics_started' in g:
+            _record(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _teardown_request(exception=None):
+        if 'metrics_started' not in g:
+            return
+        HTTP_IN_FLIGHT.dec()
+        # Unhandled exception: after_request never ran
+        if not g.get('metrics_recorded'):
+            _record(500)
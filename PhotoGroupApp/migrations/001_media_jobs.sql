@@ -0,0 +1,19 @@
+-- Background media processing: per-photo status + durable job queue.
+-- Existing photos already have thumbnails, so they default to 'ready'.
+
+ALTER TABLE photos
+    ADD COLUMN processing_status ENUM('pending', 'processing', 'ready', 'failed') NOT NULL DEFAULT 'ready';
+
+CREATE TABLE media_jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    photo_id INT NOT NULL,
+    job_type VARCHAR(32) NOT NULL DEFAULT 'thumbnail',
+    status ENUM('pending', 'running', 'done', 'failed') NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    last_error VARCHAR(255) DEFAULT NULL,
+    run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    locked_at TIMESTAMP NULL DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (photo_id) REFERENCES photos(id) ON DELETE CASCADE,
+    KEY idx_media_jobs_status (status, run_after)
+);
@@ -0,0 +1,15 @@
+-- Resumable chunked uploads: one row per in-progress upload.
+-- The bytes themselves live in uploads/.partial/<id>.part
+
+CREATE TABLE upload_sessions (
+    id CHAR(32) PRIMARY KEY,
+    user_id INT NOT NULL,
+    group_id INT NOT NULL,
+    file_name VARCHAR(255) NOT NULL,
+    total_size BIGINT NOT NULL,
+    checksum CHAR(64) DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (group_id) REFERENCES groups_table(id) ON DELETE CASCADE,
+    KEY idx_upload_sessions_created (created_at)
+);
@@ -0,0 +1,10 @@
+-- Content-addressed storage: photos.file_name holds the storage key "ab/cd/<sha256>.<ext>".
+-- media_blobs counts the photo rows sharing a key so identical media is stored once.
+-- Files uploaded before this change keep their flat names and have no row here.
+
+CREATE TABLE media_blobs (
+    storage_key VARCHAR(255) PRIMARY KEY,
+    ref_count INT NOT NULL DEFAULT 1,
+    size BIGINT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
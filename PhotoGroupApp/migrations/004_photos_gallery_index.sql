@@ -0,0 +1,3 @@
+-- Keyset pagination for /group-photos seeks on (group_id, upload_date, id).
+
+CREATE INDEX idx_photos_group_date ON photos (group_id, upload_date, id);
@@ -0,0 +1,9 @@
+-- Indexes for the membership checks and the gallery visibility anti-joins.
+--   groups_members (user_id, group_id): membership/admin check at the top of almost every endpoint
+--   blocked_users (blocked_id, blocker_id): "who blocked me" side of the block filter
+--     (the blocker side is already covered by unique_block (blocker_id, blocked_id))
+--   hidden_photos is covered by unique_hide (user_id, photo_id)
+--   photos (group_id, upload_date, id) was added in 004_photos_gallery_index.sql
+
+CREATE INDEX idx_groups_members_user_group ON groups_members (user_id, group_id);
+CREATE INDEX idx_blocked_users_blocked ON blocked_users (blocked_id, blocker_id);
@@ -0,0 +1,18 @@
+-- Video metadata written by the 'video' media job (poster frame, length, size, scrub sprite).
+-- Width/height are the displayed dimensions, i.e. after applying `rotation`.
+
+ALTER TABLE photos
+    ADD COLUMN duration_ms INT DEFAULT NULL,
+    ADD COLUMN width INT DEFAULT NULL,
+    ADD COLUMN height INT DEFAULT NULL,
+    ADD COLUMN fps DECIMAL(7,3) DEFAULT NULL,
+    ADD COLUMN rotation SMALLINT NOT NULL DEFAULT 0,
+    ADD COLUMN video_codec VARCHAR(8) DEFAULT NULL,
+    ADD COLUMN sprite_frames TINYINT UNSIGNED NOT NULL DEFAULT 0;
+
+-- Analyse videos uploaded before this change. Their thumbnail is the old first frame,
+-- so 'video_backfill' always picks a new poster (written over it atomically). They
+-- stay 'ready' and visible while it runs, and keep that status if the job fails.
+INSERT INTO media_jobs (photo_id, job_type)
+SELECT id, 'video_backfill' FROM photos
+WHERE LOWER(SUBSTRING_INDEX(file_name, '.', -1)) IN ('mp4', 'mov', 'avi', 'm4v');
@@ -0,0 +1,14 @@
+-- Deferred file deletion: deleting the last photo of a file writes a tombstone in
+-- the same transaction; the file collector (storage.FileCollector) removes the
+-- original and its derivatives from disk and then drops the tombstone.
+
+CREATE TABLE file_tombstones (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    storage_key VARCHAR(255) NOT NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    last_error VARCHAR(255) DEFAULT NULL,
+    run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uniq_file_tombstones_key (storage_key),
+    KEY idx_file_tombstones_due (run_after)
+);
@@ -0,0 +1,14 @@
+-- Blocking no longer copies the blocked user's photos into hidden_photos: the gallery
+-- query already filters both sides of a block at read time (unique_block and
+-- idx_blocked_users_blocked), so block/unblock write a single row.
+-- Remove the rows materialized by the old block-user. A hide of a photo whose uploader
+-- is on either side of a block with the hider is indistinguishable from a manual hide,
+-- but the old unblock-user deleted those as well, so nothing visible changes.
+
+DELETE h FROM hidden_photos h
+JOIN photos p ON p.id = h.photo_id
+JOIN blocked_users b ON b.blocker_id = h.user_id AND b.blocked_id = p.user_id;
+
+DELETE h FROM hidden_photos h
+JOIN photos p ON p.id = h.photo_id
+JOIN blocked_users b ON b.blocked_id = h.user_id AND b.blocker_id = p.user_id;
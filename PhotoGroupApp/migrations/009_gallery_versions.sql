@@ -0,0 +1,9 @@
+-- Version counters behind the /group-photos response cache and ETags (gallery_cache.py).
+--   groups_table.gallery_version: bumped when the group's photos or what the gallery shows about them change
+--   users.visibility_version: bumped when the user hides photos or a block involving them changes
+
+ALTER TABLE groups_table
+    ADD COLUMN gallery_version INT UNSIGNED NOT NULL DEFAULT 0;
+
+ALTER TABLE users
+    ADD COLUMN visibility_version INT UNSIGNED NOT NULL DEFAULT 0;
@@ -0,0 +1,22 @@
+-- Near-duplicate detection (duplicates.py).
+--   phash: 64-bit perceptual hash of the grid thumbnail, written by the thumbnail / video jobs
+--   duplicate_of: oldest earlier photo of the same group within DUPLICATE_MAX_DISTANCE bits
+--   idx_photos_group_phash covers loading a group's hash index
+--   idx_photos_group_duplicate serves /duplicate-clusters
+-- duplicate_of has no foreign key: a self-referencing SET NULL inside the cascade of a
+-- group or user delete is fragile in InnoDB. It may point at a deleted photo;
+-- /duplicate-clusters only returns photos that still exist.
+
+ALTER TABLE photos
+    ADD COLUMN phash BIGINT UNSIGNED DEFAULT NULL,
+    ADD COLUMN duplicate_of INT DEFAULT NULL,
+    ADD KEY idx_photos_group_phash (group_id, phash),
+    ADD KEY idx_photos_group_duplicate (group_id, duplicate_of);
+
+-- Hash what was uploaded before this change. Existing thumbnails are reused, so the
+-- jobs only decode the small thumbnail (videos are probed again for their metadata).
+-- Oldest first: a photo is only marked as a duplicate of an earlier one.
+INSERT INTO media_jobs (photo_id, job_type)
+SELECT id, IF(LOWER(SUBSTRING_INDEX(file_name, '.', -1)) IN ('mp4', 'mov', 'avi', 'm4v'), 'video', 'thumbnail')
+FROM photos
+ORDER BY id;
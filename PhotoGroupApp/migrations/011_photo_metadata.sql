@@ -0,0 +1,26 @@
+-- Photo metadata from EXIF (media.read_metadata), written by the thumbnail / metadata jobs.
+--   taken_at: capture time (UTC when the camera recorded an offset), else the upload time
+--   width / height: displayed size of images too (were only set for videos)
+--   idx_photos_group_taken serves /group-photos?sort=taken, the same way
+--   idx_photos_group_date serves the default order
+
+ALTER TABLE photos
+    ADD COLUMN taken_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    ADD COLUMN orientation TINYINT UNSIGNED DEFAULT NULL,
+    ADD COLUMN camera_make VARCHAR(64) DEFAULT NULL,
+    ADD COLUMN camera_model VARCHAR(64) DEFAULT NULL,
+    ADD COLUMN latitude DECIMAL(9,6) DEFAULT NULL,
+    ADD COLUMN longitude DECIMAL(9,6) DEFAULT NULL;
+
+UPDATE photos SET taken_at = upload_date;
+
+ALTER TABLE photos ADD KEY idx_photos_group_taken (group_id, taken_at, id);
+
+-- Read the EXIF of images uploaded before this change. metadata jobs only parse the
+-- file header; photos that are already ready stay visible while they run.
+INSERT INTO media_jobs (photo_id, job_type)
+SELECT id, 'metadata'
+FROM photos
+WHERE processing_status = 'ready'
+AND LOWER(SUBSTRING_INDEX(file_name, '.', -1)) NOT IN ('mp4', 'mov', 'avi', 'm4v')
+ORDER BY id;
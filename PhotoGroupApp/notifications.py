@@ -0,0 +1,277 @@
+import os
+import time
+import queue
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
+
+# =====================================================
+# PUSH NOTIFICATION DISPATCHER
+# =====================================================
+# Handlers only enqueue messages; a background thread sends them to Expo over a
+# pooled HTTP session, in chunks of the provider's batch size, with retries and
+# a circuit breaker so a slow or failing provider never stalls a request.
+
+EXPO_PUSH_URL = os.getenv('EXPO_PUSH_URL', 'https://exp.host/--/api/v2/push/send')
+PUSH_BATCH_SIZE = int(os.getenv('PUSH_BATCH_SIZE', 100))        # Expo accepts max 100 messages per request
+PUSH_TIMEOUT = float(os.getenv('PUSH_TIMEOUT', 10))
+PUSH_MAX_RETRIES = int(os.getenv('PUSH_MAX_RETRIES', 3))
+PUSH_BACKOFF = float(os.getenv('PUSH_BACKOFF', 0.5))            # Seconds, doubled on every retry
+PUSH_QUEUE_SIZE = int(os.getenv('PUSH_QUEUE_SIZE', 10000))
+BREAKER_THRESHOLD = int(os.getenv('PUSH_BREAKER_THRESHOLD', 5))  # Consecutive failed batches before opening
+BREAKER_COOLDOWN = float(os.getenv('PUSH_BREAKER_COOLDOWN', 30))
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `threshold` consecutive failures; while open every batch is dropped.
+    After `cooldown` seconds one trial batch is let through (half-open): success closes it again.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        return self.state != 'open'
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+
+class PushDispatcher:
+    def __init__(self, url=EXPO_PUSH_URL, batch_size=PUSH_BATCH_SIZE, timeout=PUSH_TIMEOUT,
+                 max_retries=PUSH_MAX_RETRIES, backoff=PUSH_BACKOFF, queue_size=PUSH_QUEUE_SIZE):
+        self.url = url
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker()
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.session.headers.update({
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+            "Content-Type": "application/json"
+        })
+
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "dropped": 0, "retries": 0, "ticket_errors": 0, "requests": 0}
+
+    def send(self, tokens, title, body, data=None):
+        """Queues one message per token. Never blocks the caller and never raises."""
+        for token in tokens or []:
+            message = {"to": token, "sound": "default", "title": title, "body": body, "data": data or {}}
+            try:
+                self._queue.put_nowait(message)
+                self._count("queued")
+            except queue.Full:
+                self._count("dropped")
+        self._ensure_worker()
+
+    def _count(self, key, n=1):
+        # Called from request threads and the worker thread alike
+        with self._lock:
+            self.stats[key] += n
+
+    def flush(self):
+        """Blocks until every queued message has been handled (used by tests and benchmarks)."""
+        self._queue.join()
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='push-dispatcher', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Drain whatever else is waiting, up to one provider batch
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._deliver(batch)
+            except Exception as e:
+                print(f"Push notification error: {e}")
+                self._count("failed", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _deliver(self, batch):
+        if not self.breaker.allow():
+            self._count("dropped", len(batch))
+            return
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count("retries")
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                self._count("requests")
+                response = self.session.post(self.url, json=batch, timeout=self.timeout)
+                if response.status_code == 429 or response.status_code >= 500:
+                    continue
+                if response.status_code >= 400:
+                    # Malformed request: retrying won't help and the provider is healthy
+                    print(f"Push notification rejected: {response.status_code} {response.text[:200]}")
+                    self._count("failed", len(batch))
+                    return
+
+                tickets = response.json().get("data", [])
+                errors = sum(1 for t in tickets if t.get("status") == "error")
+                self._count("ticket_errors", errors)
+                self._count("sent", len(batch) - errors)
+                self.breaker.record_success()
+                return
+            except requests.RequestException as e:
+                print(f"Push notification error (attempt {attempt + 1}): {e}")
+
+        self._count("failed", len(batch))
+        self.breaker.record_failure()
+
+
+dispatcher = PushDispatcher()
+
+def _push_metrics():
+    with dispatcher._lock:
+        stats = dict(dispatcher.stats)
+    return [
+        ("push_messages_total", "counter", "Push messages by outcome.",
+         [({"result": key}, stats[key]) for key in ("queued", "sent", "failed", "dropped", "ticket_errors")]),
+        ("push_requests_total", "counter", "HTTP requests made to the push provider.", [({}, stats["requests"])]),
+        ("push_retries_total", "counter", "Push batches retried.", [({}, stats["retries"])]),
+        ("push_queue_depth", "gauge", "Messages waiting to be sent.", [({}, dispatcher._queue.qsize())]),
+        ("push_breaker_open", "gauge", "1 while the circuit breaker rejects batches.", [({}, dispatcher.breaker.state == 'open')])
+    ]
+
+metrics.register_collector(_push_metrics)
+
+# =====================================================
+# UPLOAD NOTIFICATION COALESCING
+# =====================================================
+# Uploads by one member to one group within UPLOAD_NOTIFY_WINDOW seconds of each
+# other become a single "N new items" push per recipient. The window restarts
+# with every upload but the first upload never waits longer than
+# UPLOAD_NOTIFY_MAX_DELAY. Pending counts live in this process only: uploads of one
+# burst handled by different worker processes give one push per process, and a
+# restart drops what was still pending. UPLOAD_NOTIFY_WINDOW=0 sends right away.
+
+UPLOAD_NOTIFY_WINDOW = float(os.getenv('UPLOAD_NOTIFY_WINDOW', 20))
+UPLOAD_NOTIFY_MAX_DELAY = float(os.getenv('UPLOAD_NOTIFY_MAX_DELAY', 120))
+
+
+class UploadCoalescer:
+    """
+    Counts uploads per (group, uploader) and calls flush_fn(group_id, uploader_id, count)
+    from a background thread once the burst is over.
+    """
+
+    def __init__(self, flush_fn, window=UPLOAD_NOTIFY_WINDOW, max_delay=UPLOAD_NOTIFY_MAX_DELAY):
+        self.flush_fn = flush_fn
+        self.window = window
+        self.max_delay = max_delay
+        self._pending = {}  # (group_id, uploader_id) -> [count, first_at, due_at]
+        self._cond = threading.Condition()
+        self._thread = None
+        self.stats = {"uploads": 0, "notifications": 0}
+        metrics.register_collector(self._metrics)
+
+    def add(self, group_id, uploader_id, count=1):
+        if self.window <= 0:
+            with self._cond:
+                self.stats["uploads"] += count
+            self._flush_one(group_id, uploader_id, count)
+            return
+
+        now = time.monotonic()
+        key = (str(group_id), str(uploader_id))
+        with self._cond:
+            self.stats["uploads"] += count
+            entry = self._pending.get(key)
+            if entry is None:
+                self._pending[key] = [count, now, now + self.window]
+            else:
+                entry[0] += count
+                entry[2] = min(now + self.window, entry[1] + self.max_delay)
+            self._cond.notify()
+        self._ensure_worker()
+
+    def flush(self):
+        """Sends everything pending now (used by tests and benchmarks)."""
+        with self._cond:
+            pending, self._pending = self._pending, {}
+        for (group_id, uploader_id), entry in pending.items():
+            self._flush_one(group_id, uploader_id, entry[0])
+
+    def _flush_one(self, group_id, uploader_id, count):
+        try:
+            self.flush_fn(group_id, uploader_id, count)
+            with self._cond:
+                self.stats["notifications"] += 1
+        except Exception as e:
+            print(f"Upload notification error: {e}")
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._cond:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='upload-notifier', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    due = [key for key, entry in self._pending.items() if entry[2] <= now]
+                    if due:
+                        break
+                    next_due = min((entry[2] for entry in self._pending.values()), default=None)
+                    self._cond.wait(None if next_due is None else next_due - now)
+                ready = [(key, self._pending.pop(key)[0]) for key in due]
+            for (group_id, uploader_id), count in ready:
+                self._flush_one(group_id, uploader_id, count)
+
+    def _metrics(self):
+        with self._cond:
+            pending = len(self._pending)
+            stats = dict(self.stats)
+        return [
+            ("upload_notify_uploads_total", "counter", "Uploads that asked for a group notification.", [({}, stats["uploads"])]),
+            ("upload_notify_sent_total", "counter", "Coalesced upload notifications sent.", [({}, stats["notifications"])]),
+            ("upload_notify_pending", "gauge", "Upload bursts waiting for their window to close.", [({}, pending)])
+        ]
+
+# --- HELPER: PUSH NOTIFICATION ---
+def send_expo_push_notification(tokens, title, body, data=None):
+    if not tokens: return
+    dispatcher.send(tokens, title, body, data)
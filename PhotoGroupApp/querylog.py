@@ -0,0 +1,165 @@
+import os
+import re
+import time
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from flask import request, has_request_context
+
+# =====================================================
+# SLOW QUERY LOG + PER-STATEMENT STATS
+# =====================================================
+# Every statement run through a pooled connection's cursor is normalized
+# (whitespace collapsed, literals and IN lists folded) and aggregated.
+# Statements slower than DB_SLOW_QUERY_MS are printed with the route that ran
+# them and get an EXPLAIN plan captured in the background, on a separate
+# connection (the caller's cursor may still have unread rows).
+
+SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', 200))
+EXPLAIN_SLOW = os.getenv('DB_EXPLAIN_SLOW', '1') == '1'
+EXPLAIN_INTERVAL = float(os.getenv('DB_EXPLAIN_INTERVAL', 300))  # Re-explain a statement at most this often
+MAX_STATEMENTS = int(os.getenv('DB_QUERY_STATS_SIZE', 1000))
+RECENT_SLOW = 100
+
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE', 'WITH')
+
+_WS_RE = re.compile(r'\s+')
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|%\(\w+\)s')
+_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """SELECT ... WHERE id IN (%s,%s,%s) AND x = 'a'  ->  SELECT ... WHERE id IN (?+) AND x = ?"""
+    sql = _WS_RE.sub(' ', sql).strip()
+    sql = _STRING_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    return _IN_LIST_RE.sub('IN (?+)', sql)
+
+def _route():
+    if has_request_context():
+        return f"{request.method} {request.endpoint or request.path}"
+    return threading.current_thread().name
+
+
+class QueryLog:
+    def __init__(self, slow_ms=SLOW_QUERY_MS, max_statements=MAX_STATEMENTS):
+        self.slow_ms = slow_ms
+        self.max_statements = max_statements
+        self._stats = {}                 # normalized -> {count, total_ms, max_ms, slow, routes}
+        self._recent = deque(maxlen=RECENT_SLOW)
+        self._explained_at = {}          # normalized -> monotonic time of last EXPLAIN
+        self._lock = threading.Lock()
+        self._explain_queue = queue.Queue(maxsize=100)
+        self._explain_thread = None
+        self.dropped_statements = 0
+
+    def record(self, sql, params, seconds, many=False):
+        if isinstance(sql, bytes):
+            sql = sql.decode(errors='replace')
+        statement = normalize_sql(sql)
+        ms = seconds * 1000
+        route = _route()
+        slow = ms >= self.slow_ms
+
+        with self._lock:
+            entry = self._stats.get(statement)
+            if entry is None:
+                if len(self._stats) >= self.max_statements:
+                    self.dropped_statements += 1
+                    entry = None
+                else:
+                    entry = self._stats[statement] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0, "routes": {}}
+            if entry is not None:
+                entry["count"] += 1
+                entry["total_ms"] += ms
+                entry["max_ms"] = max(entry["max_ms"], ms)
+                entry["routes"][route] = entry["routes"].get(route, 0) + 1
+                if slow:
+                    entry["slow"] += 1
+
+            if not slow:
+                return
+            event = {
+                "at": datetime.utcnow().isoformat() + 'Z',
+                "ms": round(ms, 2),
+                "route": route,
+                "statement": statement,
+                "plan": None
+            }
+            self._recent.append(event)
+
+            explain = EXPLAIN_SLOW and not many and sql.lstrip()[:7].upper().startswith(EXPLAINABLE)
+            if explain:
+                last = self._explained_at.get(statement)
+                explain = last is None or time.monotonic() - last >= EXPLAIN_INTERVAL
+                if explain:
+                    self._explained_at[statement] = time.monotonic()
+
+        print(f"Slow query ({ms:.0f} ms) in {route}: {statement}")
+        if explain:
+            try:
+                self._explain_queue.put_nowait((event, sql, params))
+                self._ensure_explainer()
+            except queue.Full:
+                pass
+
+    def _ensure_explainer(self):
+        if self._explain_thread is None or not self._explain_thread.is_alive():
+            with self._lock:
+                if self._explain_thread is None or not self._explain_thread.is_alive():
+                    self._explain_thread = threading.Thread(target=self._explain_loop, name='query-explainer', daemon=True)
+                    self._explain_thread.start()
+
+    def _explain_loop(self):
+        from db import get_pool
+        while True:
+            event, sql, params = self._explain_queue.get()
+            try:
+                conn = get_pool().checkout()
+                try:
+                    cursor = conn.untimed_cursor(dictionary=True)
+                    cursor.execute("EXPLAIN " + sql, params)
+                    event["plan"] = [
+                        {k: v for k, v in row.items() if k in ('id', 'select_type', 'table', 'type', 'possible_keys',
+                                                             'key', 'rows', 'filtered', 'Extra')}
+                        for row in cursor.fetchall()
+                    ]
+                    cursor.close()
+                finally:
+                    conn.release()
+                print(f"EXPLAIN {event['statement']}: {event['plan']}")
+            except Exception as e:
+                event["plan"] = f"EXPLAIN failed: {e}"
+
+    def snapshot(self, sort='total_ms', limit=50):
+        with self._lock:
+            statements = [
+                {"statement": s, "count": e["count"], "total_ms": round(e["total_ms"], 2),
+                 "avg_ms": round(e["total_ms"] / e["count"], 2), "max_ms": round(e["max_ms"], 2),
+                 "slow": e["slow"], "routes": dict(e["routes"])}
+                for s, e in self._stats.items()
+            ]
+            recent = list(self._recent)
+        statements.sort(key=lambda e: e.get(sort, 0), reverse=True)
+        return {
+            "slow_threshold_ms": self.slow_ms,
+            "tracked_statements": len(statements),
+            "dropped_statements": self.dropped_statements,
+            "statements": statements[:limit],
+            "recent_slow": list(reversed(recent))
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._recent.clear()
+            self._explained_at.clear()
+            self.dropped_statements = 0
+
+
+query_log = QueryLog()
@@ -0,0 +1,94 @@
+from datetime import datetime
+
+# =====================================================
+# DAILY UPLOAD QUOTAS
+# =====================================================
+# plan -> (photos per day, videos per day). Unknown plans get the 'demo' limits.
+PLAN_LIMITS = {
+    'demo': (10, 2),
+    'free': (10, 2),
+    'pro': (50, 10)
+}
+DEFAULT_PLAN = 'demo'
+
+def plan_limits(plan):
+    """(photo_limit, video_limit) of a plan."""
+    return PLAN_LIMITS.get(plan or DEFAULT_PLAN, PLAN_LIMITS[DEFAULT_PLAN])
+
+def _limit_sql(index):
+    """CASE expression yielding the plan's limit, so the check runs inside the UPDATE."""
+    whens = ' '.join('WHEN %s THEN %s' for _ in PLAN_LIMITS)
+    params = [v for plan, limits in PLAN_LIMITS.items() for v in (plan, limits[index])]
+    return f"CASE plan {whens} ELSE %s END", params + [PLAN_LIMITS[DEFAULT_PLAN][index]]
+
+def reserve_upload_quota(conn, cursor, user_id, is_video):
+    """
+    Takes one slot of today's quota in a single conditional UPDATE: the counters are
+    reset when last_upload_date is an older day, and the row only changes while the
+    count is under the plan's limit. Concurrent uploads serialize on the row lock, so
+    they can't both pass the check. Returns True if a slot was reserved (committed).
+    """
+    return reserve_quota(conn, cursor, user_id, 0 if is_video else 1, 1 if is_video else 0)
+
+def reserve_quota(conn, cursor, user_id, photos, videos):
+    """Same as reserve_upload_quota() for a whole batch: all of it is reserved or none."""
+    today = datetime.utcnow().date()
+    photo_limit_sql, photo_limit_params = _limit_sql(0)
+    video_limit_sql, video_limit_params = _limit_sql(1)
+
+    # Assignments run left to right: last_upload_date must be written last
+    cursor.execute(f"""
+        UPDATE users
+        SET daily_photo_count = IF(last_upload_date = %s, daily_photo_count, 0) + %s,
+            daily_video_count = IF(last_upload_date = %s, daily_video_count, 0) + %s,
+            last_upload_date = %s
+        WHERE id = %s
+        AND (%s = 0 OR IF(last_upload_date = %s, daily_photo_count, 0) + %s <= {photo_limit_sql})
+        AND (%s = 0 OR IF(last_upload_date = %s, daily_video_count, 0) + %s <= {video_limit_sql})
+    """, (today, photos, today, videos, today, user_id,
+          photos, today, photos, *photo_limit_params, videos, today, videos, *video_limit_params))
+    reserved = cursor.rowcount == 1
+    conn.commit()
+    return reserved
+
+def remaining_quota(cursor, user_id):
+    """(photos_left, videos_left) for today."""
+    today = datetime.utcnow().date()
+    photo_limit_sql, photo_limit_params = _limit_sql(0)
+    video_limit_sql, video_limit_params = _limit_sql(1)
+    cursor.execute(f"""
+        SELECT GREATEST({photo_limit_sql} - IF(last_upload_date = %s, daily_photo_count, 0), 0) AS photos_left,
+               GREATEST({video_limit_sql} - IF(last_upload_date = %s, daily_video_count, 0), 0) AS videos_left
+        FROM users WHERE id = %s
+    """, (*photo_limit_params, today, *video_limit_params, today, user_id))
+    row = cursor.fetchone()
+    return (int(row['photos_left']), int(row['videos_left'])) if row else (0, 0)
+
+def quota_available(cursor, user_id, is_video):
+    """Read-only version of the check, for failing fast before a long transfer."""
+    today = datetime.utcnow().date()
+    column = 'daily_video_count' if is_video else 'daily_photo_count'
+    limit_sql, limit_params = _limit_sql(1 if is_video else 0)
+    cursor.execute(f"""
+        SELECT IF(last_upload_date = %s, {column}, 0) < {limit_sql} AS ok
+        FROM users WHERE id = %s
+    """, (today, *limit_params, user_id))
+    row = cursor.fetchone()
+    return bool(row and row['ok'])
+
+def release_upload_quota(conn, cursor, user_id, is_video):
+    """Gives back a slot taken by reserve_upload_quota() when the upload fails afterwards."""
+    release_quota(conn, cursor, user_id, 0 if is_video else 1, 1 if is_video else 0)
+
+def release_quota(conn, cursor, user_id, photos, videos):
+    """Gives back slots taken by reserve_quota()."""
+    try:
+        conn.rollback()
+        cursor.execute("""
+            UPDATE users SET daily_photo_count = GREATEST(daily_photo_count - %s, 0),
+                             daily_video_count = GREATEST(daily_video_count - %s, 0)
+            WHERE id = %s AND last_upload_date = %s
+        """, (photos, videos, user_id, datetime.utcnow().date()))
+        conn.commit()
+    except Exception as e:
+        print(f"Quota release failed for user {user_id}: {e}")
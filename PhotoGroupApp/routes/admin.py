@@ -1,4 +1,3 @@
-import os
 import random
 import datetime
 import smtplib
@@ -6,6 +5,9 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from flask import Blueprint, request, jsonify, current_app, url_for
 from db import get_db_connection
+import storage
+import gallery_cache
+import authz
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -49,14 +51,14 @@ def initiate_2fa():
         cursor = conn.cursor(dictionary=True)
 
         # 1. Check Admin & Get Email
-        cursor.execute("SELECT email, is_super_admin FROM users WHERE id = %s", (admin_id,))
-        user = cursor.fetchone()
-
-        if not user or user['is_super_admin'] != 1:
+        if not authz.is_super_admin(cursor, admin_id):
             cursor.close(); conn.close()
             return jsonify({"error": "Yetkisiz erişim."}), 403
+
+        cursor.execute("SELECT email FROM users WHERE id = %s", (admin_id,))
+        user = cursor.fetchone()
         
-        if not user['email']:
+        if not user or not user['email']:
             cursor.close(); conn.close()
             return jsonify({"error": "Kullanıcının kayıtlı e-posta adresi yok."}), 400
 
@@ -178,10 +180,7 @@ def get_reports():
         cursor = conn.cursor(dictionary=True)
 
         # Check Admin
-        cursor.execute("SELECT is_super_admin FROM users WHERE id = %s", (admin_id,))
-        user = cursor.fetchone()
-
-        if not user or user['is_super_admin'] != 1:
+        if not authz.is_super_admin(cursor, admin_id):
             cursor.close(); conn.close()
             return jsonify({"error": "Unauthorized"}), 403
 
@@ -232,9 +231,7 @@ def get_banned_users():
         cursor = conn.cursor(dictionary=True)
 
         # Check Admin
-        cursor.execute("SELECT is_super_admin FROM users WHERE id = %s", (admin_id,))
-        user = cursor.fetchone()
-        if not user or user['is_super_admin'] != 1:
+        if not authz.is_super_admin(cursor, admin_id):
             cursor.close(); conn.close()
             return jsonify({"error": "Unauthorized"}), 403
 
@@ -260,9 +257,10 @@ def unban_user():
         cursor = conn.cursor()
 
         # Check Admin
-        cursor.execute("SELECT is_super_admin FROM users WHERE id = %s", (admin_id,))
-        row = cursor.fetchone() 
-        
+        if not authz.is_super_admin(cursor, admin_id):
+            cursor.close(); conn.close()
+            return jsonify({"error": "Unauthorized"}), 403
+
         cursor.execute("DELETE FROM banned_users WHERE id = %s", (banned_id,))
         conn.commit()
         
@@ -289,9 +287,7 @@ def manual_ban():
         cursor = conn.cursor(dictionary=True)
 
         # Check Admin
-        cursor.execute("SELECT is_super_admin FROM users WHERE id = %s", (admin_id,))
-        user = cursor.fetchone()
-        if not user or user['is_super_admin'] != 1:
+        if not authz.is_super_admin(cursor, admin_id):
             cursor.close(); conn.close()
             return jsonify({"error": "Unauthorized"}), 403
 
@@ -318,10 +314,13 @@ def manual_ban():
             return jsonify({"error": "Cannot ban yourself"}), 400
 
         cursor.execute("INSERT INTO banned_users (phone_number, username, reason) VALUES (%s, %s, %s)", (phone, uname, "Manual Ban by Admin"))
+        storage.release_photos(cursor, "user_id = %s", (uid,))
+        gallery_cache.bump_groups_of_uploader(cursor, uid)
         cursor.execute("DELETE FROM users WHERE id=%s", (uid,))
 
         conn.commit()
         cursor.close(); conn.close()
+        authz.invalidate_user(uid)
         return jsonify({"message": "User banned and deleted"}), 200
 
     except Exception as e:
@@ -341,28 +340,26 @@ def resolve_report():
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
-        cursor.execute("SELECT is_super_admin FROM users WHERE id = %s", (admin_id,))
-        user = cursor.fetchone()
-        if not user or user['is_super_admin'] != 1:
+        if not authz.is_super_admin(cursor, admin_id):
             cursor.close(); conn.close()
             return jsonify({"error": "Unauthorized"}), 403
 
+        banned_user_id = None
         if action == 'delete_content':
             cursor.execute("SELECT photo_id FROM content_reports WHERE id=%s", (report_id,))
             row = cursor.fetchone()
             if row:
                 photo_id = row['photo_id']
-                cursor.execute("SELECT file_name FROM photos WHERE id=%s", (photo_id,))
+                cursor.execute("SELECT file_name, group_id FROM photos WHERE id=%s", (photo_id,))
                 photo_row = cursor.fetchone()
-                
-                if photo_row:
-                    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], photo_row['file_name'])
-                    thumb_path = os.path.join(current_app.config['UPLOAD_FOLDER'], f"thumb_{photo_row['file_name']}")
-                    if os.path.exists(file_path): os.remove(file_path)
-                    if os.path.exists(thumb_path): os.remove(thumb_path)
 
                 cursor.execute("DELETE FROM photos WHERE id = %s", (photo_id,))
                 cursor.execute("DELETE FROM content_reports WHERE id=%s", (report_id,))
+
+                # Tombstoned with the delete, unless another photo shares the file
+                if photo_row:
+                    storage.release_reference(cursor, photo_row['file_name'])
+                    gallery_cache.bump_group(cursor, photo_row['group_id'])
                 
         elif action == 'dismiss':
             cursor.execute("DELETE FROM content_reports WHERE id=%s", (report_id,))
@@ -381,11 +378,16 @@ def resolve_report():
                     uname = user_row['username']
                     
                     cursor.execute("INSERT INTO banned_users (phone_number, username, reason) VALUES (%s, %s, %s)", (phone, uname, "Reported Content"))
+                    storage.release_photos(cursor, "user_id = %s", (uploader_id,))
+                    gallery_cache.bump_groups_of_uploader(cursor, uploader_id)
                     cursor.execute("DELETE FROM users WHERE id=%s", (uploader_id,))
                     cursor.execute("DELETE FROM content_reports WHERE id=%s", (report_id,))
+                    banned_user_id = uploader_id
 
         conn.commit()
         cursor.close(); conn.close()
+        if banned_user_id:
+            authz.invalidate_user(banned_user_id)
         return jsonify({"message": "Action completed"}), 200
 
     except Exception as e:
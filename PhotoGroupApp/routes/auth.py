@@ -6,7 +6,11 @@ from flask import Blueprint, request, jsonify, current_app, url_for
 from db import get_db_connection
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-from PIL import Image
+from media import create_thumbnail, thumb_name
+from quotas import plan_limits
+import authz
+import storage
+import gallery_cache
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -15,20 +19,6 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# --- THUMBNAIL HELPER ---
-def create_thumbnail(image_path, filename):
-    try:
-        size = (300, 300)
-        with Image.open(image_path) as img:
-            if img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
-            img.thumbnail(size)
-            thumb_path = os.path.join(os.path.dirname(image_path), f"thumb_{filename}")
-            img.save(thumb_path, "JPEG", quality=85)
-            print(f"Profile thumbnail created: thumb_{filename}")
-    except Exception as e:
-        print(f"Thumbnail error: {e}")
-
 @auth_bp.route('/register', methods=['POST'])
 def register():
     if not request.is_json:
@@ -111,7 +101,7 @@ def login():
             thumb_url = None
             if user['profile_image']:
                 profile_url = url_for('groups.uploaded_file', filename=user['profile_image'], _external=True)
-                thumb_url = url_for('groups.uploaded_file', filename=f"thumb_{user['profile_image']}", _external=True)
+                thumb_url = url_for('groups.uploaded_file', filename=thumb_name(user['profile_image']), _external=True)
 
             return jsonify({
                 "message": "Login successful",
@@ -146,10 +136,14 @@ def get_user():
         """, (user_id,))
         user = cursor.fetchone()
         
+        # Daily limits of the user's plan, so the app doesn't hard-code them
+        if user:
+            user['photo_limit'], user['video_limit'] = plan_limits(user['plan'])
+
         # Add URLs
         if user and user['profile_image']:
             user['profile_url'] = url_for('groups.uploaded_file', filename=user['profile_image'], _external=True)
-            user['thumbnail_url'] = url_for('groups.uploaded_file', filename=f"thumb_{user['profile_image']}", _external=True)
+            user['thumbnail_url'] = url_for('groups.uploaded_file', filename=thumb_name(user['profile_image']), _external=True)
         else:
             user['profile_url'] = None
             user['thumbnail_url'] = None
@@ -209,6 +203,8 @@ def update_profile():
         params.append(user_id)
 
         cursor.execute(query, tuple(params))
+        # Galleries show the uploader's name and avatar
+        gallery_cache.bump_groups_of_uploader(cursor, user_id)
         conn.commit()
         cursor.close()
         conn.close()
@@ -229,10 +225,13 @@ def delete_account():
         conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute("DELETE FROM groups_members WHERE user_id = %s", (user_id,))
+        storage.release_photos(cursor, "user_id = %s", (user_id,))
+        gallery_cache.bump_groups_of_uploader(cursor, user_id)
         cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
         conn.commit()
         cursor.close()
         conn.close()
+        authz.invalidate_user(user_id)
         return jsonify({"message": "Account deleted successfully"}), 200
     except Exception as e:
         print(f"Error deleting account: {e}")
@@ -0,0 +1,197 @@
+import os
+import io
+import json
+import zipfile
+from flask import Blueprint, request, jsonify, current_app, Response
+from werkzeug.utils import secure_filename
+from db import get_db_connection
+import authz
+from media import is_video_file
+from routes.photos import GALLERY_SQL
+
+exports_bp = Blueprint('exports', __name__)
+
+# =====================================================
+# ALBUM EXPORT (STREAMING ZIP)
+# =====================================================
+# GET /group-export/manifest?group_id=&user_id=        -> what the ZIP will contain, plus `until_id`
+# GET /group-export?group_id=&user_id=&until_id=&after_id= -> the ZIP itself
+# Only media the member can see in the gallery is included (hides and blocks apply).
+# The archive is produced while it is sent: entries are written with data descriptors,
+# media is STORED (JPEG/MP4 don't compress any further) and files are copied in
+# EXPORT_CHUNK_SIZE pieces, so memory stays flat and nothing is written to disk.
+# Resuming: items are ordered by id and `until_id` pins the album to the state of the
+# manifest, so after a dropped download the client asks for after_id=<last complete id>.
+
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 256 * 1024))
+STORED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'mp4', 'mov', 'm4v', 'avi'}
+MANIFEST_NAME = 'manifest.json'
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only, unseekable sink for ZipFile; the generator drains it after every write."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def entry_name(photo):
+    ext = photo['file_name'].rsplit('.', 1)[-1].lower()
+    return f"{photo['upload_date'].strftime('%Y%m%d_%H%M%S')}_{photo['id']}.{ext}"
+
+def export_items(cursor, group_id, user_id, until_id, after_id=0):
+    """Visible media of the group with after_id < id <= until_id, oldest first."""
+    cursor.execute(
+        GALLERY_SQL + " AND photos.id > %s AND photos.id <= %s ORDER BY photos.id",
+        (group_id, user_id, user_id, user_id, after_id, until_id)
+    )
+    return cursor.fetchall()
+
+def build_manifest(group_id, until_id, photos, sizes):
+    items = [{
+        "id": p['id'],
+        "name": entry_name(p),
+        "size": sizes.get(p['id']),
+        "type": 'video' if is_video_file(p['file_name']) else 'image',
+        "date": p['upload_date'].isoformat() + 'Z',
+        "uploaded_by": p['username']
+    } for p in photos]
+    return {
+        "group_id": int(group_id),
+        "until_id": until_id,
+        "count": len(items),
+        "total_size": sum(i['size'] or 0 for i in items),
+        "items": items
+    }
+
+def file_sizes(upload_folder, photos):
+    """photo id -> size on disk; files missing from disk are left out."""
+    sizes = {}
+    for p in photos:
+        try:
+            sizes[p['id']] = os.path.getsize(os.path.join(upload_folder, p['file_name']))
+        except OSError:
+            pass
+    return sizes
+
+def stream_zip(upload_folder, photos, sizes, manifest):
+    # An empty chunk would end a chunked response early
+    return (chunk for chunk in _zip_chunks(upload_folder, photos, sizes, manifest) if chunk)
+
+def _zip_chunks(upload_folder, photos, sizes, manifest):
+    out = _ZipStream()
+    with zipfile.ZipFile(out, 'w', allowZip64=True) as zf:
+        zf.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=1), zipfile.ZIP_DEFLATED)
+        yield out.drain()
+
+        for photo in photos:
+            if photo['id'] not in sizes:
+                continue
+            path = os.path.join(upload_folder, photo['file_name'])
+            try:
+                src = open(path, 'rb')
+            except OSError as e:
+                # Deleted after the manifest was built
+                print(f"Export skipped {photo['file_name']}: {e}")
+                continue
+
+            with src:
+                zinfo = zipfile.ZipInfo(entry_name(photo), photo['upload_date'].timetuple()[:6])
+                ext = photo['file_name'].rsplit('.', 1)[-1].lower()
+                zinfo.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                zinfo.file_size = sizes[photo['id']]   # lets ZipFile pick ZIP64 up front for huge videos
+                with zf.open(zinfo, 'w') as dst:
+                    for buf in iter(lambda: src.read(EXPORT_CHUNK_SIZE), b''):
+                        dst.write(buf)
+                        yield out.drain()
+            yield out.drain()
+    # Central directory
+    yield out.drain()
+
+def load_export(group_id, user_id, until_id=None, after_id=0):
+    """Membership check + visible items. Returns (error_response, group_name, until_id, photos)."""
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        if not authz.is_member(cursor, user_id, group_id):
+            return (jsonify({"error": "Unauthorized"}), 403), None, None, None
+
+        cursor.execute("SELECT group_name FROM groups_table WHERE id = %s", (group_id,))
+        group = cursor.fetchone()
+        if not group:
+            return (jsonify({"error": "Group not found"}), 404), None, None, None
+
+        if until_id is None:
+            cursor.execute("SELECT COALESCE(MAX(id), 0) AS max_id FROM photos WHERE group_id = %s", (group_id,))
+            until_id = cursor.fetchone()['max_id']
+
+        return None, group['group_name'], until_id, export_items(cursor, group_id, user_id, until_id, after_id)
+    finally:
+        cursor.close(); conn.close()
+
+def _export_args():
+    group_id = request.args.get('group_id')
+    user_id = request.args.get('user_id')
+    until_id = request.args.get('until_id', type=int)
+    after_id = request.args.get('after_id', 0, type=int)
+    return group_id, user_id, until_id, after_id
+
+# ==========================================
+# EXPORT MANIFEST
+# ==========================================
+@exports_bp.route('/group-export/manifest', methods=['GET'])
+def export_manifest():
+    group_id, user_id, until_id, after_id = _export_args()
+    if not group_id or not user_id:
+        return jsonify({"error": "group_id and user_id are required"}), 400
+
+    try:
+        error, _, until_id, photos = load_export(group_id, user_id, until_id, after_id)
+        if error:
+            return error
+        sizes = file_sizes(current_app.config['UPLOAD_FOLDER'], photos)
+        return jsonify(build_manifest(group_id, until_id, photos, sizes)), 200
+    except Exception as e:
+        print(f"Export manifest error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+# ==========================================
+# EXPORT ZIP
+# ==========================================
+@exports_bp.route('/group-export', methods=['GET'])
+def export_zip():
+    group_id, user_id, until_id, after_id = _export_args()
+    if not group_id or not user_id:
+        return jsonify({"error": "group_id and user_id are required"}), 400
+
+    try:
+        error, group_name, until_id, photos = load_export(group_id, user_id, until_id, after_id)
+        if error:
+            return error
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        sizes = file_sizes(upload_folder, photos)
+        manifest = build_manifest(group_id, until_id, photos, sizes)
+    except Exception as e:
+        print(f"Export error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    download_name = secure_filename(group_name or '') or f"group_{group_id}"
+    if after_id:
+        download_name += f"_after_{after_id}"
+    response = Response(stream_zip(upload_folder, photos, sizes, manifest), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="{download_name}.zip"'
+    response.headers['X-Export-Until-Id'] = str(until_id)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
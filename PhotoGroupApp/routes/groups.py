@@ -1,11 +1,14 @@
 import os
 import string
 import random
-import requests # IMPORT REQUESTS
-from flask import Blueprint, request, jsonify, current_app, send_from_directory, url_for
+from flask import Blueprint, request, jsonify, current_app, url_for
 from werkzeug.utils import secure_filename
 from db import get_db_connection
-from PIL import Image
+from notifications import send_expo_push_notification
+from media import create_thumbnail, serve_upload, thumb_name
+import authz
+import storage
+import gallery_cache
 
 groups_bp = Blueprint('groups', __name__)
 
@@ -18,40 +21,6 @@ def generate_group_code():
     characters = string.ascii_uppercase + string.digits
     return ''.join(random.choices(characters, k=8))
 
-# --- HELPER: THUMBNAIL ---
-def create_thumbnail(image_path, filename):
-    try:
-        size = (300, 300)
-        with Image.open(image_path) as img:
-            if img.mode in ('RGBA', 'P'): img = img.convert('RGB')
-            img.thumbnail(size)
-            thumb_path = os.path.join(os.path.dirname(image_path), f"thumb_{filename}")
-            img.save(thumb_path, "JPEG", quality=85)
-            return f"thumb_{filename}"
-    except Exception as e:
-        print(f"Thumbnail error: {e}")
-        return None
-
-# --- HELPER: PUSH NOTIFICATION ---
-def send_expo_push_notification(tokens, title, body, data=None):
-    if not tokens: return
-    try:
-        message = {
-            "to": tokens,
-            "sound": "default",
-            "title": title,
-            "body": body,
-            "data": data or {}
-        }
-        # Expo API Call
-        requests.post(
-            "https://exp.host/--/api/v2/push/send",
-            json=message,
-            headers={"Accept": "application/json", "Accept-Encoding": "gzip, deflate"}
-        )
-    except Exception as e:
-        print(f"Push notification error: {e}")
-
 # ==========================================
 # CREATE GROUP (Updated with Description)
 # ==========================================
@@ -95,6 +64,7 @@ def create_group():
         conn.commit()
         cursor.close()
         conn.close()
+        authz.invalidate_membership(user_id, group_id)
 
         return jsonify({"message": "Group created", "group_code": new_code}), 201
     except Exception as e:
@@ -127,9 +97,7 @@ def edit_group():
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("SELECT is_admin FROM groups_members WHERE user_id=%s AND group_id=%s", (user_id, group_id))
-        row = cursor.fetchone()
-        if not row or row['is_admin'] != 1:
+        if not authz.is_group_admin(cursor, user_id, group_id):
             cursor.close(); conn.close()
             return jsonify({"error": "Unauthorized"}), 403
 
@@ -165,17 +133,17 @@ def delete_group():
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
-        cursor.execute("SELECT is_admin FROM groups_members WHERE user_id=%s AND group_id=%s", (user_id, group_id))
-        row = cursor.fetchone()
-        
-        if not row or row['is_admin'] != 1:
+        if not authz.is_group_admin(cursor, user_id, group_id):
             cursor.close(); conn.close()
             return jsonify({"error": "Unauthorized. Only admins can delete the group."}), 403
 
+        # Photos go with the group (ON DELETE CASCADE): release their files first
+        storage.release_photos(cursor, "group_id = %s", (group_id,))
         cursor.execute("DELETE FROM groups_table WHERE id = %s", (group_id,))
         
         conn.commit()
         cursor.close(); conn.close()
+        authz.invalidate_group(group_id)
         return jsonify({"message": "Group deleted successfully"}), 200
 
     except Exception as e:
@@ -209,8 +177,7 @@ def join_group():
         group_id = group['id']
 
         # 2. Check Member
-        cursor.execute("SELECT id FROM groups_members WHERE user_id = %s AND group_id = %s", (user_id, group_id))
-        if cursor.fetchone():
+        if authz.is_member(cursor, user_id, group_id):
             cursor.close(); conn.close()
             return jsonify({"status": "error", "message": "Zaten bu grubun üyesisiniz"}), 409
 
@@ -275,20 +242,11 @@ def block_user():
         conn = get_db_connection()
         cursor = conn.cursor()
 
+        # One row, whatever the size of either library: the gallery query filters
+        # photos on both sides of a block at read time (see photos.GALLERY_SQL)
         sql_block = "INSERT IGNORE INTO blocked_users (blocker_id, blocked_id) VALUES (%s, %s)"
         cursor.execute(sql_block, (blocker_id, blocked_id))
-
-        sql_hide_1 = """
-            INSERT IGNORE INTO hidden_photos (user_id, photo_id)
-            SELECT %s, id FROM photos WHERE user_id = %s
-        """
-        cursor.execute(sql_hide_1, (blocker_id, blocked_id))
-
-        sql_hide_2 = """
-            INSERT IGNORE INTO hidden_photos (user_id, photo_id)
-            SELECT %s, id FROM photos WHERE user_id = %s
-        """
-        cursor.execute(sql_hide_2, (blocked_id, blocker_id))
+        gallery_cache.bump_visibility(cursor, blocker_id, blocked_id)
 
         conn.commit()
         cursor.close(); conn.close()
@@ -310,20 +268,7 @@ def unblock_user():
         cursor = conn.cursor()
 
         cursor.execute("DELETE FROM blocked_users WHERE blocker_id = %s AND blocked_id = %s", (blocker_id, blocked_id))
-
-        sql_unhide_1 = """
-            DELETE FROM hidden_photos 
-            WHERE user_id = %s 
-            AND photo_id IN (SELECT id FROM photos WHERE user_id = %s)
-        """
-        cursor.execute(sql_unhide_1, (blocker_id, blocked_id))
-
-        sql_unhide_2 = """
-            DELETE FROM hidden_photos 
-            WHERE user_id = %s 
-            AND photo_id IN (SELECT id FROM photos WHERE user_id = %s)
-        """
-        cursor.execute(sql_unhide_2, (blocked_id, blocker_id))
+        gallery_cache.bump_visibility(cursor, blocker_id, blocked_id)
 
         conn.commit()
         cursor.close(); conn.close()
@@ -353,7 +298,7 @@ def get_blocked_users():
         
         for u in users:
             if u['profile_image']:
-                 u['thumbnail_url'] = url_for('groups.uploaded_file', filename=f"thumb_{u['profile_image']}", _external=True)
+                 u['thumbnail_url'] = url_for('groups.uploaded_file', filename=thumb_name(u['profile_image']), _external=True)
             else:
                  u['thumbnail_url'] = None
 
@@ -376,9 +321,7 @@ def toggle_joining():
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        cursor.execute("SELECT is_admin FROM groups_members WHERE user_id=%s AND group_id=%s", (user_id, group_id))
-        row = cursor.fetchone()
-        if not row or row[0] != 1:
+        if not authz.is_group_admin(cursor, user_id, group_id):
             cursor.close(); conn.close()
             return jsonify({"error": "Sadece yöneticiler değiştirebilir"}), 403
 
@@ -410,7 +353,7 @@ def get_group_requests():
 
         for r in requests:
             if r['profile_image']:
-                r['thumbnail_url'] = url_for('groups.uploaded_file', filename=f"thumb_{r['profile_image']}", _external=True)
+                r['thumbnail_url'] = url_for('groups.uploaded_file', filename=thumb_name(r['profile_image']), _external=True)
             else:
                 r['thumbnail_url'] = None
 
@@ -434,9 +377,7 @@ def manage_request():
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        cursor.execute("SELECT is_admin FROM groups_members WHERE user_id=%s AND group_id=%s", (admin_id, group_id))
-        row = cursor.fetchone()
-        if not row or row[0] != 1:
+        if not authz.is_group_admin(cursor, admin_id, group_id):
             cursor.close(); conn.close()
             return jsonify({"error": "Sadece yöneticiler isteklere cevap verebilir"}), 403
 
@@ -470,6 +411,8 @@ def manage_request():
         
         conn.commit()
         cursor.close(); conn.close()
+        if action == 'accept':
+            authz.invalidate_membership(target_user_id, group_id)
         return jsonify({"message": "Success"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -489,9 +432,7 @@ def manage_member():
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        cursor.execute("SELECT is_admin FROM groups_members WHERE user_id=%s AND group_id=%s", (admin_id, group_id))
-        row = cursor.fetchone()
-        if not row or row[0] != 1:
+        if not authz.is_group_admin(cursor, admin_id, group_id):
             cursor.close(); conn.close()
             return jsonify({"error": "Unauthorized"}), 403
 
@@ -504,6 +445,8 @@ def manage_member():
 
         conn.commit()
         cursor.close(); conn.close()
+        authz.invalidate_membership(target_user_id, group_id)
+        authz.invalidate_membership(admin_id, group_id)
         return jsonify({"message": "Success"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -524,14 +467,14 @@ def leave_group():
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
-        cursor.execute("SELECT is_admin FROM groups_members WHERE user_id=%s AND group_id=%s", (user_id, group_id))
-        member_row = cursor.fetchone()
+        membership = authz.get_membership(cursor, user_id, group_id)
 
-        if not member_row:
+        if not membership:
             cursor.close(); conn.close()
             return jsonify({"error": "Member not found"}), 404
         
-        was_admin = (member_row['is_admin'] == 1)
+        was_admin = membership['is_admin']
+        heir_id = None
 
         cursor.execute("DELETE FROM groups_members WHERE user_id=%s AND group_id=%s", (user_id, group_id))
 
@@ -539,10 +482,12 @@ def leave_group():
         res = cursor.fetchone()
         
         if res['count'] == 0:
+            storage.release_photos(cursor, "group_id = %s", (group_id,))
             cursor.execute("DELETE FROM groups_table WHERE id=%s", (group_id,))
             
             conn.commit()
             cursor.close(); conn.close()
+            authz.invalidate_group(group_id)
             return jsonify({"message": "Left group and group deleted (empty)"}), 200
         
         if was_admin:
@@ -555,9 +500,13 @@ def leave_group():
                 
                 if heir:
                     cursor.execute("UPDATE groups_members SET is_admin=1 WHERE user_id=%s AND group_id=%s", (heir['user_id'], group_id))
+                    heir_id = heir['user_id']
 
         conn.commit()
         cursor.close(); conn.close()
+        authz.invalidate_membership(user_id, group_id)
+        if heir_id:
+            authz.invalidate_membership(heir_id, group_id)
         return jsonify({"message": "Left group successfully"}), 200
 
     except Exception as e:
@@ -579,7 +528,7 @@ def get_group_details():
         if group:
             if group['picture']:
                 group['picture_url'] = url_for('groups.uploaded_file', filename=group['picture'], _external=True)
-                group['thumbnail_url'] = url_for('groups.uploaded_file', filename=f"thumb_{group['picture']}", _external=True)
+                group['thumbnail_url'] = url_for('groups.uploaded_file', filename=thumb_name(group['picture']), _external=True)
             else:
                 group['picture_url'] = None; group['thumbnail_url'] = None
         
@@ -591,9 +540,9 @@ def get_group_details():
 # ==========================================
 # OTHER ROUTES 
 # ==========================================
-@groups_bp.route('/uploads/<filename>')
+@groups_bp.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
+    return serve_upload(filename)
 
 @groups_bp.route('/get-group-members', methods=['GET'])
 def get_group_members():
@@ -616,8 +565,8 @@ def get_group_members():
             FROM groups_members gm 
             JOIN users u ON gm.user_id = u.id 
             WHERE gm.group_id = %s 
-            AND u.id NOT IN (
-                SELECT blocker_id FROM blocked_users WHERE blocked_id = %s
+            AND NOT EXISTS (
+                SELECT 1 FROM blocked_users b WHERE b.blocked_id = %s AND b.blocker_id = u.id
             )
             ORDER BY sort_order ASC, u.username ASC
         """
@@ -627,7 +576,7 @@ def get_group_members():
         for m in members:
             if m['profile_image']:
                 m['profile_url'] = url_for('groups.uploaded_file', filename=m['profile_image'], _external=True)
-                m['thumbnail_url'] = url_for('groups.uploaded_file', filename=f"thumb_{m['profile_image']}", _external=True)
+                m['thumbnail_url'] = url_for('groups.uploaded_file', filename=thumb_name(m['profile_image']), _external=True)
             else: m['profile_url'] = None; m['thumbnail_url'] = None
             
         cursor.close(); conn.close()
@@ -656,30 +605,36 @@ def get_user_groups():
         cursor.execute(sql, (user_id,))
         groups = cursor.fetchall()
         
-        # 2. Fetch Members for each group to display in the list
+        # 2. Fetch Members of all groups in ONE query (was one query per group)
+        # We fetch ID and Username to sort them in Frontend
+        members_by_group = {g['id']: [] for g in groups}
+        if groups:
+            format_strings = ','.join(['%s'] * len(groups))
+            member_sql = f"""
+                SELECT gm.group_id, u.id, u.username 
+                FROM groups_members gm 
+                JOIN users u ON u.id = gm.user_id 
+                WHERE gm.group_id IN ({format_strings})
+                AND NOT EXISTS (
+                    SELECT 1 FROM blocked_users b WHERE b.blocked_id = %s AND b.blocker_id = u.id
+                )
+                ORDER BY gm.group_id, gm.id
+            """
+            cursor.execute(member_sql, (*members_by_group, user_id))
+            for m in cursor.fetchall():
+                members_by_group[m.pop('group_id')].append(m)
+
         for g in groups:
             # Image URL logic
             if g['picture']:
                 g['picture_url'] = url_for('groups.uploaded_file', filename=g['picture'], _external=True)
-                g['thumbnail_url'] = url_for('groups.uploaded_file', filename=f"thumb_{g['picture']}", _external=True)
+                g['thumbnail_url'] = url_for('groups.uploaded_file', filename=thumb_name(g['picture']), _external=True)
             else: 
                 g['picture_url'] = None
                 g['thumbnail_url'] = None
-            
-            # --- NEW: Fetch Members for this group ---
-            # We fetch ID and Username to sort them in Frontend
-            member_sql = """
-                SELECT u.id, u.username 
-                FROM users u 
-                JOIN groups_members gm ON u.id = gm.user_id 
-                WHERE gm.group_id = %s
-                AND u.id NOT IN (
-                    SELECT blocker_id FROM blocked_users WHERE blocked_id = %s
-                )
-            """
-            cursor.execute(member_sql, (g['id'], user_id))
-            g['members'] = cursor.fetchall()
-            # -----------------------------------------
+
+            g['members'] = members_by_group[g['id']]
+            g['member_count'] = len(g['members'])
 
         cursor.close(); conn.close()
         return jsonify(groups), 200
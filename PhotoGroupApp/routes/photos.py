@@ -1,10 +1,17 @@
 import os
-import requests # IMPORT REQUESTS FOR PUSH
-from flask import Blueprint, request, jsonify, send_from_directory, current_app, url_for
-from werkzeug.utils import secure_filename
+import json
+import base64
+from flask import Blueprint, request, jsonify, current_app, url_for
 from db import get_db_connection
-from PIL import Image, ImageOps
-import cv2 
+from notifications import send_expo_push_notification, UploadCoalescer
+from media import is_video_file, serve_upload, thumb_name, sprite_name
+import jobs
+import storage
+import quotas
+import authz
+import metrics
+import gallery_cache
+import duplicates
 from datetime import datetime
 
 photos_bp = Blueprint('photos', __name__)
@@ -15,65 +22,103 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# --- HELPER: PUSH NOTIFICATION (Repeated to keep file standalone) ---
-def send_expo_push_notification(tokens, title, body, data=None):
-    if not tokens: return
-    try:
-        message = {
-            "to": tokens,
-            "sound": "default",
-            "title": title,
-            "body": body,
-            "data": data or {}
-        }
-        requests.post(
-            "https://exp.host/--/api/v2/push/send",
-            json=message,
-            headers={"Accept": "application/json", "Accept-Encoding": "gzip, deflate"}
-        )
-    except Exception as e:
-        print(f"Push notification error: {e}")
+# ==========================================
+# HELPER: UPLOAD CHECKS (MEMBERSHIP + DAILY QUOTA)
+# ==========================================
+def check_upload_allowed(conn, cursor, user_id, group_id, is_video, reserve=True):
+    """
+    Returns None if the user may upload to the group, otherwise an error (json, status) tuple.
+    With reserve=True a slot of today's quota is taken atomically; the caller must give it
+    back with quotas.release_upload_quota() if the upload fails before register_upload().
+    """
+    # Check membership
+    if not authz.is_member(cursor, user_id, group_id):
+        return jsonify({"error": "You are not a member of this group"}), 403
+
+    if reserve:
+        allowed = quotas.reserve_upload_quota(conn, cursor, user_id, is_video)
+    else:
+        allowed = quotas.quota_available(cursor, user_id, is_video)
+    if not allowed:
+        return jsonify({"error": "LIMIT_EXCEEDED_VIDEO" if is_video else "LIMIT_EXCEEDED_PHOTO"}), 403
+    return None
 
 # ==========================================
-# HELPER: CREATE THUMBNAIL 
+# HELPER: REGISTER A SAVED UPLOAD
 # ==========================================
-def create_thumbnail(file_path, filename):
+def register_upload(conn, cursor, user_id, group_id, filename, size, is_video):
+    """
+    Inserts the photo row for a file already in storage and notifies the group.
+    The daily counter was already taken by check_upload_allowed().
+    """
+    # Thumbnail (and for videos metadata + sprite) is generated by the background media worker
+    # taken_at starts as the upload time; the media job replaces it with the EXIF capture time
+    now = datetime.utcnow()
+    sql = "INSERT INTO photos (file_name, user_id, group_id, upload_date, taken_at, processing_status) VALUES (%s, %s, %s, %s, %s, 'pending')"
+    cursor.execute(sql, (filename, user_id, group_id, now, now))
+    jobs.enqueue_job(cursor, cursor.lastrowid, 'video' if is_video else 'thumbnail')
+    storage.add_reference(cursor, filename, size)
+    gallery_cache.bump_group(cursor, group_id)
+    conn.commit()
+    jobs.wake_worker()
+    metrics.UPLOADS.inc(('video' if is_video else 'image',))
+
+    # The upload is saved at this point: a notification problem must not fail it
     try:
-        size = (300, 300)
-        ext = filename.rsplit('.', 1)[1].lower()
-        is_video = ext in ['mp4', 'mov', 'avi', 'm4v']
-        
-        img = None
-
-        if is_video:
-            cam = cv2.VideoCapture(file_path)
-            ret, frame = cam.read()
-            if ret:
-                img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-            cam.release()
-        else:
-            img = Image.open(file_path)
-            img = ImageOps.exif_transpose(img) 
-            if img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
-
-        if img:
-            img.thumbnail(size)
-            thumb_filename = f"thumb_{filename}"
-            thumb_path = os.path.join(os.path.dirname(file_path), thumb_filename)
-            img.save(thumb_path, "JPEG", quality=85)
-            print(f"Thumbnail created: {thumb_filename}")
-            return thumb_filename
-        else:
-            print("Failed to load image or video frame")
-            return None
-
+        notify_group_upload(user_id, group_id)
     except Exception as e:
-        print(f"Thumbnail creation failed: {e}")
-        return None
+        print(f"Upload notification error: {e}")
+
+def notify_group_upload(user_id, group_id, count=1):
+    """Counts uploads toward the group's next 'new media' push (coalesced per group and uploader)."""
+    upload_notifier.add(group_id, user_id, count)
+
+def send_group_upload_notification(group_id, user_id, count):
+    """Pushes 'new media' (or 'N new items') to every other member of the group that has notifications on."""
+    # Runs on the notifier thread, after the burst: names and recipients are read once per burst
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT group_name FROM groups_table WHERE id = %s", (group_id,))
+        group_row = cursor.fetchone()
+
+        cursor.execute("SELECT username FROM users WHERE id = %s", (user_id,))
+        user_row = cursor.fetchone()
+
+        if group_row and user_row:
+            group_name = group_row['group_name']
+            uploader_name = user_row['username']
+
+            sql_members = """
+                SELECT u.push_token 
+                FROM users u
+                JOIN groups_members gm ON u.id = gm.user_id
+                WHERE gm.group_id = %s 
+                AND u.id != %s 
+                AND u.push_token IS NOT NULL
+                AND gm.notifications = 1
+            """
+            cursor.execute(sql_members, (group_id, user_id))
+            members = cursor.fetchall()
+
+            tokens = [m['push_token'] for m in members]
+
+            if tokens:
+                title = group_name
+                if count > 1:
+                    body = f"{uploader_name}, {group_name} grubuna {count} yeni medya yükledi"
+                else:
+                    body = f"{uploader_name}, {group_name} grubuna medya yükledi"
+                data_payload = {"screen": "MediaGallery", "groupId": group_id}
+
+                send_expo_push_notification(tokens, title, body, data_payload)
+    finally:
+        cursor.close(); conn.close()
+
+upload_notifier = UploadCoalescer(send_group_upload_notification)
 
 # ==========================================
-# UPLOAD PHOTO (UPDATED WITH LAZY RESET LIMITS)
+# UPLOAD PHOTO (DAILY QUOTA RESERVED UP FRONT)
 # ==========================================
 @photos_bp.route('/upload-photo', methods=['POST'])
 def upload_photo():
@@ -92,108 +137,28 @@ def upload_photo():
             conn = get_db_connection()
             cursor = conn.cursor(dictionary=True)
 
-            # Check membership
-            cursor.execute("SELECT id FROM groups_members WHERE user_id = %s AND group_id = %s", (user_id, group_id))
-            if not cursor.fetchone():
-                cursor.close(); conn.close()
-                return jsonify({"error": "You are not a member of this group"}), 403
-
-            # --- START: LAZY RESET & LIMIT CHECK LOGIC ---
-            
             # Determine if it is video or photo based on extension
-            ext = file.filename.rsplit('.', 1)[1].lower()
-            is_video = ext in ['mp4', 'mov', 'avi', 'm4v']
-            
-            # Get current UTC date
-            today = datetime.utcnow().date()
-            
-            # Fetch user stats
-            cursor.execute("SELECT daily_photo_count, daily_video_count, last_upload_date FROM users WHERE id = %s", (user_id,))
-            user_stats = cursor.fetchone()
-            
-            if user_stats:
-                db_date = user_stats['last_upload_date']
-                
-                # LAZY RESET: If date is None (new user) or old date (yesterday etc.)
-                if db_date is None or db_date < today:
-                    # Reset counters and update date to today
-                    cursor.execute("""
-                        UPDATE users 
-                        SET daily_photo_count = 0, daily_video_count = 0, last_upload_date = %s 
-                        WHERE id = %s
-                    """, (today, user_id))
-                    conn.commit()
-                    # Update local variables for the check below
-                    current_p_count = 0
-                    current_v_count = 0
-                else:
-                    current_p_count = user_stats['daily_photo_count']
-                    current_v_count = user_stats['daily_video_count']
-
-                # LIMIT CHECK
-                if is_video:
-                    if current_v_count >= 2:
-                        cursor.close(); conn.close()
-                        return jsonify({"error": "LIMIT_EXCEEDED_VIDEO"}), 403
-                else:
-                    if current_p_count >= 10:
-                        cursor.close(); conn.close()
-                        return jsonify({"error": "LIMIT_EXCEEDED_PHOTO"}), 403
-            
-            # --- END: LAZY RESET & LIMIT CHECK LOGIC ---
-
-            filename = secure_filename(file.filename)
-            upload_folder = current_app.config['UPLOAD_FOLDER']
-            save_path = os.path.join(upload_folder, filename)
-            file.save(save_path)
+            is_video = is_video_file(file.filename)
 
-            create_thumbnail(save_path, filename)
-
-            sql = "INSERT INTO photos (file_name, user_id, group_id, upload_date) VALUES (%s, %s, %s, %s)"
-            cursor.execute(sql, (filename, user_id, group_id, datetime.utcnow()))
-            
-            # --- INCREMENT COUNTER AFTER SUCCESSFUL INSERT ---
-            if is_video:
-                cursor.execute("UPDATE users SET daily_video_count = daily_video_count + 1 WHERE id = %s", (user_id,))
-            else:
-                cursor.execute("UPDATE users SET daily_photo_count = daily_photo_count + 1 WHERE id = %s", (user_id,))
-            
-            conn.commit()
-            # -------------------------------------------------
+            # Quota slot is reserved before a single byte is written
+            error = check_upload_allowed(conn, cursor, user_id, group_id, is_video)
+            if error:
+                cursor.close(); conn.close()
+                return error
+
+            try:
+                # Stored under its content hash (ab/cd/<sha256>.<ext>), hashed while streaming to disk
+                ext = file.filename.rsplit('.', 1)[1].lower()
+                upload_folder = current_app.config['UPLOAD_FOLDER']
+                filename, size = storage.save_stream(upload_folder, file.stream, ext)
+                metrics.UPLOAD_BYTES.inc(('upload-photo',), size)
+
+                register_upload(conn, cursor, user_id, group_id, filename, size, is_video)
+            except Exception:
+                quotas.release_upload_quota(conn, cursor, user_id, is_video)
+                cursor.close(); conn.close()
+                raise
 
-            # ... (NOTIFICATION LOGIC) ...
-            # Get Group Info & Uploader Info
-            cursor.execute("SELECT group_name FROM groups_table WHERE id = %s", (group_id,))
-            group_row = cursor.fetchone()
-            
-            cursor.execute("SELECT username FROM users WHERE id = %s", (user_id,))
-            user_row = cursor.fetchone()
-
-            if group_row and user_row:
-                group_name = group_row['group_name']
-                uploader_name = user_row['username']
-
-                sql_members = """
-                    SELECT u.push_token 
-                    FROM users u
-                    JOIN groups_members gm ON u.id = gm.user_id
-                    WHERE gm.group_id = %s 
-                    AND u.id != %s 
-                    AND u.push_token IS NOT NULL
-                    AND gm.notifications = 1
-                """
-                cursor.execute(sql_members, (group_id, user_id))
-                members = cursor.fetchall()
-                
-                tokens = [m['push_token'] for m in members]
-
-                if tokens:
-                    title = group_name
-                    body = f"{uploader_name}, {group_name} grubuna medya yükledi"
-                    data_payload = {"screen": "MediaGallery", "groupId": group_id}
-                    
-                    send_expo_push_notification(tokens, title, body, data_payload)
-            
             cursor.close(); conn.close()
 
             return jsonify({"message": "File uploaded successfully", "filename": filename}), 201
@@ -202,70 +167,397 @@ def upload_photo():
     else:
         return jsonify({"error": "File type not allowed"}), 400
 
+# ==========================================
+# BATCH UPLOAD (ALBUM)
+# ==========================================
+# Many files in one multipart request (field "photos", repeated). Membership and
+# quota are checked once for the whole batch, every row goes in with one multi-row
+# INSERT in one transaction, and the group gets a single "N new items" push.
+# All or nothing: one disallowed file type or a batch over the quota rejects the request.
+MAX_BATCH_FILES = int(os.getenv('UPLOAD_BATCH_MAX_FILES', 50))
+
+@photos_bp.route('/upload-photos', methods=['POST'])
+def upload_photos():
+    files = [f for f in request.files.getlist('photos') if f and f.filename]
+    user_id = request.form.get('user_id')
+    group_id = request.form.get('group_id')
+
+    if not files or not user_id or not group_id:
+        return jsonify({"error": "Missing data"}), 400
+    if len(files) > MAX_BATCH_FILES:
+        return jsonify({"error": f"Too many files (max {MAX_BATCH_FILES})"}), 400
+    rejected = [f.filename for f in files if not allowed_file(f.filename)]
+    if rejected:
+        return jsonify({"error": "File type not allowed", "files": rejected}), 400
+
+    is_video = [is_video_file(f.filename) for f in files]
+    videos = sum(is_video)
+    photos = len(files) - videos
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        if not authz.is_member(cursor, user_id, group_id):
+            cursor.close(); conn.close()
+            return jsonify({"error": "You are not a member of this group"}), 403
+
+        # The whole batch is reserved in one conditional UPDATE before anything is written
+        if not quotas.reserve_quota(conn, cursor, user_id, photos, videos):
+            photos_left, videos_left = quotas.remaining_quota(cursor, user_id)
+            cursor.close(); conn.close()
+            error = "LIMIT_EXCEEDED_VIDEO" if videos > videos_left else "LIMIT_EXCEEDED_PHOTO"
+            return jsonify({"error": error, "photos_left": photos_left, "videos_left": videos_left}), 403
+
+        saved = []   # (storage key, size)
+        try:
+            upload_folder = current_app.config['UPLOAD_FOLDER']
+            for file in files:
+                ext = file.filename.rsplit('.', 1)[1].lower()
+                saved.append(storage.save_stream(upload_folder, file.stream, ext))
+            metrics.UPLOAD_BYTES.inc(('upload-photos',), sum(size for _, size in saved))
+
+            # One INSERT per row so each id is exactly its lastrowid: a multi-row INSERT's ids
+            # need not be consecutive, and reading them back can pick up other rows.
+            # Still a single transaction, so the batch stays all or nothing.
+            now = datetime.utcnow()
+            photo_ids = []
+            for key, _ in saved:
+                cursor.execute("""
+                    INSERT INTO photos (file_name, user_id, group_id, upload_date, taken_at, processing_status)
+                    VALUES (%s, %s, %s, %s, %s, 'pending')
+                """, (key, user_id, group_id, now, now))
+                photo_ids.append(cursor.lastrowid)
+            jobs.enqueue_jobs(cursor, [(pid, 'video' if video else 'thumbnail') for pid, video in zip(photo_ids, is_video)])
+            storage.add_references(cursor, saved)
+            gallery_cache.bump_group(cursor, group_id)
+            conn.commit()
+        except Exception:
+            storage.discard_files(conn, cursor, [key for key, _ in saved])
+            quotas.release_quota(conn, cursor, user_id, photos, videos)
+            cursor.close(); conn.close()
+            raise
+
+        jobs.wake_worker()
+        if photos:
+            metrics.UPLOADS.inc(('image',), photos)
+        if videos:
+            metrics.UPLOADS.inc(('video',), videos)
+
+        try:
+            notify_group_upload(user_id, group_id, len(saved))
+        except Exception as e:
+            print(f"Upload notification error: {e}")
+
+        cursor.close(); conn.close()
+        items = [
+            {"id": pid, "filename": key, "type": 'video' if video else 'image'}
+            for pid, (key, _), video in zip(photo_ids, saved, is_video)
+        ]
+        return jsonify({"message": f"{len(items)} files uploaded successfully", "items": items}), 201
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# ==========================================
+# HELPER: GALLERY CURSORS
+# ==========================================
+# Opaque keyset cursor: base64url of [sort date, id] of the last item returned
+# (upload_date, or taken_at with sort=taken).
+MAX_PAGE_SIZE = 200
+
+# sort -> date column; both are indexed as (group_id, <column>, id)
+GALLERY_SORTS = {
+    'uploaded': 'upload_date',   # idx_photos_group_date
+    'taken': 'taken_at'          # idx_photos_group_taken
+}
+
+def encode_cursor(sort_date, photo_id):
+    raw = json.dumps([sort_date.isoformat(), photo_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor_str):
+    raw = base64.urlsafe_b64decode(cursor_str + '=' * (-len(cursor_str) % 4))
+    sort_date, photo_id = json.loads(raw)
+    return datetime.fromisoformat(sort_date), int(photo_id)
+
 # ==========================================
 # GET GROUP PHOTOS
 # ==========================================
+# Photos of a group visible to one member: not hidden by them and not from a user
+# on either side of a block. Written as NOT EXISTS anti-joins so MySQL can probe
+# unique_hide / unique_block / idx_blocked_users_blocked per row. Blocks are only
+# enforced here; hidden_photos holds explicit hides, never a blocked user's library.
+# Params: group_id, user_id, user_id, user_id
+GALLERY_SQL = """
+    SELECT photos.id, photos.file_name, photos.upload_date, photos.processing_status,
+           photos.duration_ms, photos.width, photos.height, photos.sprite_frames, photos.duplicate_of,
+           photos.taken_at,
+           photos.user_id as uploader_id, 
+           users.username, users.profile_image
+    FROM photos 
+    JOIN users ON photos.user_id = users.id 
+    WHERE photos.group_id = %s 
+    AND NOT EXISTS (
+        SELECT 1 FROM hidden_photos h WHERE h.user_id = %s AND h.photo_id = photos.id
+    )
+    AND NOT EXISTS (
+        SELECT 1 FROM blocked_users b WHERE b.blocker_id = %s AND b.blocked_id = photos.user_id
+    )
+    AND NOT EXISTS (
+        SELECT 1 FROM blocked_users b WHERE b.blocked_id = %s AND b.blocker_id = photos.user_id
+    )
+"""
+
+# Without `limit` the whole gallery is returned as a list (old clients).
+# With `limit` (and `cursor` from the previous page) the response is
+# {"items": [...], "next_cursor": "..." | null}, newest first.
+# sort=taken orders by capture time (EXIF) instead of upload time.
 @photos_bp.route('/group-photos', methods=['GET'])
 def get_group_photos():
     group_id = request.args.get('group_id')
     user_id = request.args.get('user_id')
+    limit = request.args.get('limit', type=int)
+    page_cursor = request.args.get('cursor')
+    sort = request.args.get('sort', 'uploaded')
 
     if not group_id or not user_id:
         return jsonify({"error": "group_id and user_id are required"}), 400
+    if sort not in GALLERY_SORTS:
+        return jsonify({"error": "sort must be 'uploaded' or 'taken'"}), 400
+    sort_column = GALLERY_SORTS[sort]
+
+    paginated = limit is not None or page_cursor is not None
+    if paginated:
+        limit = max(1, min(limit or MAX_PAGE_SIZE, MAX_PAGE_SIZE))
+        after = None
+        if page_cursor:
+            try:
+                after = decode_cursor(page_cursor)
+            except Exception:
+                return jsonify({"error": "Invalid cursor"}), 400
 
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
-        cursor.execute("SELECT id FROM groups_members WHERE user_id = %s AND group_id = %s", (user_id, group_id))
-        if not cursor.fetchone():
+        if not authz.is_member(cursor, user_id, group_id):
             cursor.close(); conn.close()
             return jsonify({"error": "Unauthorized"}), 403
 
-        sql = """
-            SELECT photos.id, photos.file_name, photos.upload_date, 
-                   photos.user_id as uploader_id, 
-                   users.username, users.profile_image
-            FROM photos 
-            JOIN users ON photos.user_id = users.id 
-            WHERE photos.group_id = %s 
-            AND photos.id NOT IN (SELECT photo_id FROM hidden_photos WHERE user_id = %s)
-            AND photos.user_id NOT IN (
-                SELECT blocked_id FROM blocked_users WHERE blocker_id = %s
-                UNION
-                SELECT blocked_id FROM blocked_users WHERE blocked_id = %s
-            )
-            ORDER BY photos.upload_date DESC
-        """
-        cursor.execute(sql, (group_id, user_id, user_id, user_id))
+        # Unchanged gallery: answered from the two version numbers, photos aren't read
+        versions = gallery_cache.get_versions(cursor, group_id, user_id)
+        if versions is None:
+            cursor.close(); conn.close()
+            return jsonify({"error": "Not found"}), 404
+        key = gallery_cache.cache_key(group_id, user_id, versions, (request.host_url, sort, limit if paginated else None, page_cursor))
+        etag = gallery_cache.etag_for(key)
+        if request.if_none_match.contains_weak(etag):
+            cursor.close(); conn.close()
+            return gallery_response(None, etag, 304)
+
+        body = gallery_cache.get(key)
+        if body is not None:
+            cursor.close(); conn.close()
+            return gallery_response(body, etag)
+
+        sql = GALLERY_SQL
+        params = [group_id, user_id, user_id, user_id]
+
+        if paginated and after:
+            # Keyset seek on (group_id, <sort column>, id) instead of OFFSET
+            sql += f" AND (photos.{sort_column} < %s OR (photos.{sort_column} = %s AND photos.id < %s))"
+            params += [after[0], after[0], after[1]]
+
+        # id breaks ties between photos uploaded (or taken) in the same second
+        sql += f" ORDER BY photos.{sort_column} DESC, photos.id DESC"
+
+        if paginated:
+            sql += " LIMIT %s"
+            params.append(limit + 1)
+
+        cursor.execute(sql, tuple(params))
         photos = cursor.fetchall()
 
+        next_cursor = None
+        if paginated and len(photos) > limit:
+            photos = photos[:limit]
+            next_cursor = encode_cursor(photos[-1][sort_column], photos[-1]['id'])
+
         photo_list = []
         for photo in photos:
             filename = photo['file_name']
             original_url = url_for('photos.uploaded_file', filename=filename, _external=True)
-            ext = filename.rsplit('.', 1)[1].lower()
-            media_type = 'video' if ext in ['mp4', 'mov', 'avi', 'm4v'] else 'image'
+            media_type = 'video' if is_video_file(filename) else 'image'
             
-            thumb_name = f"thumb_{filename}"
-            thumbnail_url = url_for('photos.uploaded_file', filename=thumb_name, _external=True)
-
-            photo_list.append({
+            # Until the worker has produced it there is no thumbnail to point at
+            status = photo['processing_status']
+            if status == 'pending':
+                status = 'processing'
+            thumbnail_url = None
+            if status == 'ready':
+                thumbnail_url = url_for('photos.uploaded_file', filename=thumb_name(filename), _external=True)
+
+            # Screen-fit rendition for the full-screen viewer (format picked from Accept)
+            preview_url = None
+            if media_type == 'image':
+                preview_url = url_for('photos.uploaded_file', filename=filename, size='screen', _external=True)
+
+            item = {
                 "id": photo['id'],
                 "url": original_url,
                 "thumbnail": thumbnail_url,
+                "preview": preview_url,
                 "type": media_type,
+                "status": status,
                 "uploader_id": photo['uploader_id'],
                 "uploaded_by": photo['username'],
                 "user_avatar": photo['profile_image'],
-                "date": photo['upload_date'].isoformat() + 'Z'
-            })
+                "date": photo['upload_date'].isoformat() + 'Z',
+                # Capture time from EXIF, or the upload time when the file has none
+                "taken": photo['taken_at'].isoformat() + 'Z',
+                # Oldest earlier photo of the group this one nearly duplicates (clients may collapse it)
+                "duplicate_of": photo['duplicate_of']
+            }
+
+            # Lets the client show length and a scrub preview without downloading the video
+            if media_type == 'video':
+                item["duration"] = photo['duration_ms'] / 1000 if photo['duration_ms'] else None
+                item["width"] = photo['width']
+                item["height"] = photo['height']
+                item["sprite"] = None
+                if photo['sprite_frames']:
+                    item["sprite"] = {
+                        "url": url_for('photos.uploaded_file', filename=sprite_name(filename), _external=True),
+                        "frames": photo['sprite_frames']
+                    }
+            else:
+                # Displayed (EXIF-rotated) size, so the grid can be laid out before images load
+                item["width"] = photo['width']
+                item["height"] = photo['height']
+            photo_list.append(item)
 
         cursor.close(); conn.close()
-        return jsonify(photo_list), 200
+        if paginated:
+            body = jsonify({"items": photo_list, "next_cursor": next_cursor}).get_data()
+        else:
+            body = jsonify(photo_list).get_data()
+        gallery_cache.put(key, body)
+        return gallery_response(body, etag)
     except Exception as e:
         return jsonify({"error": "Internal Server Error"}), 500
 
+def gallery_response(body, etag, status=200):
+    response = current_app.response_class(body, status=status, mimetype='application/json')
+    response.set_etag(etag, weak=True)
+    # Clients may keep the copy but must revalidate it (cheap: usually a 304)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# ==========================================
+# NEAR DUPLICATES
+# ==========================================
+def _visible_photos(cursor, group_id, user_id, photo_ids):
+    """id -> gallery row, for the given photos the member can see."""
+    if not photo_ids:
+        return {}
+    format_strings = ','.join(['%s'] * len(photo_ids))
+    cursor.execute(GALLERY_SQL + f" AND photos.id IN ({format_strings})",
+                   (group_id, user_id, user_id, user_id, *photo_ids))
+    return {row['id']: row for row in cursor.fetchall()}
+
+def _duplicate_item(photo):
+    thumbnail = None
+    if photo['processing_status'] == 'ready':
+        thumbnail = url_for('photos.uploaded_file', filename=thumb_name(photo['file_name']), _external=True)
+    return {
+        "id": photo['id'],
+        "thumbnail": thumbnail,
+        "type": 'video' if is_video_file(photo['file_name']) else 'image',
+        "uploader_id": photo['uploader_id'],
+        "uploaded_by": photo['username'],
+        "date": photo['upload_date'].isoformat() + 'Z'
+    }
+
+# Groups of near-identical media, built from the duplicate_of links set when each
+# upload was hashed. Largest clusters first; the oldest photo of a cluster comes first.
+@photos_bp.route('/duplicate-clusters', methods=['GET'])
+def duplicate_clusters():
+    group_id = request.args.get('group_id')
+    user_id = request.args.get('user_id')
+    if not group_id or not user_id:
+        return jsonify({"error": "group_id and user_id are required"}), 400
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        if not authz.is_member(cursor, user_id, group_id):
+            cursor.close(); conn.close()
+            return jsonify({"error": "Unauthorized"}), 403
+
+        # idx_photos_group_duplicate
+        cursor.execute("SELECT id, duplicate_of FROM photos WHERE group_id = %s AND duplicate_of IS NOT NULL", (group_id,))
+        parent = {}
+        def root(pid):
+            while parent.get(pid, pid) != pid:
+                pid = parent[pid]
+            return pid
+        for row in cursor.fetchall():
+            a, b = root(row['id']), root(row['duplicate_of'])
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+        clusters = {}
+        for pid in set(parent) | set(parent.values()):
+            clusters.setdefault(root(pid), []).append(pid)
+
+        visible = _visible_photos(cursor, group_id, user_id, [pid for members in clusters.values() for pid in members])
+        cursor.close(); conn.close()
+
+        result = []
+        for members in clusters.values():
+            items = [_duplicate_item(visible[pid]) for pid in sorted(members) if pid in visible]
+            if len(items) > 1:
+                result.append({"count": len(items), "items": items})
+        result.sort(key=lambda c: (-c["count"], c["items"][0]["id"]))
+        return jsonify({"clusters": result}), 200
+    except Exception as e:
+        print(f"Duplicate clusters error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+# Photos of the group that look like one photo, straight from the in-memory hash index
+@photos_bp.route('/similar-photos', methods=['GET'])
+def similar_photos():
+    group_id = request.args.get('group_id')
+    user_id = request.args.get('user_id')
+    photo_id = request.args.get('photo_id', type=int)
+    if not group_id or not user_id or not photo_id:
+        return jsonify({"error": "group_id, user_id and photo_id are required"}), 400
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        if not authz.is_member(cursor, user_id, group_id):
+            cursor.close(); conn.close()
+            return jsonify({"error": "Unauthorized"}), 403
+
+        matches = duplicates.similar_photos(cursor, group_id, photo_id)
+        visible = _visible_photos(cursor, group_id, user_id, [pid for pid, _ in matches])
+        cursor.close(); conn.close()
+
+        items = []
+        for pid, distance in matches:
+            if pid in visible:
+                item = _duplicate_item(visible[pid])
+                item["distance"] = distance
+                items.append(item)
+        return jsonify({"photo_id": photo_id, "items": items}), 200
+    except Exception as e:
+        print(f"Similar photos error: {e}")
+        return jsonify({"error": str(e)}), 500
+
 # ==========================================
 # BULK ACTION
 # ==========================================
@@ -287,13 +579,14 @@ def bulk_action():
             values = [(user_id, pid) for pid in photo_ids]
             sql = "INSERT IGNORE INTO hidden_photos (user_id, photo_id) VALUES (%s, %s)"
             cursor.executemany(sql, values)
+            gallery_cache.bump_visibility(cursor, user_id)
             conn.commit()
             cursor.close(); conn.close()
             return jsonify({"message": "Photos hidden successfully"}), 200
 
         elif action_type == 'delete':
             format_strings = ','.join(['%s'] * len(photo_ids))
-            cursor.execute(f"SELECT id, file_name, user_id FROM photos WHERE id IN ({format_strings})", tuple(photo_ids))
+            cursor.execute(f"SELECT id, file_name, user_id, group_id FROM photos WHERE id IN ({format_strings})", tuple(photo_ids))
             photos_to_delete = cursor.fetchall()
 
             for photo in photos_to_delete:
@@ -302,17 +595,12 @@ def bulk_action():
                     return jsonify({"error": "Unauthorized: You do not own all selected photos"}), 403
 
             cursor.execute(f"DELETE FROM photos WHERE id IN ({format_strings})", tuple(photo_ids))
-            conn.commit()
-
-            upload_folder = current_app.config['UPLOAD_FOLDER']
+            # Shared (deduplicated) files stay until their last photo is gone; the rest are
+            # tombstoned in this transaction and removed from disk by the file collector
             for photo in photos_to_delete:
-                try:
-                    file_path = os.path.join(upload_folder, photo['file_name'])
-                    if os.path.exists(file_path): os.remove(file_path)
-                    thumb_path = os.path.join(upload_folder, f"thumb_{photo['file_name']}")
-                    if os.path.exists(thumb_path): os.remove(thumb_path)
-                except Exception as e:
-                    print(f"File deletion error: {e}")
+                storage.release_reference(cursor, photo['file_name'])
+            gallery_cache.bump_group(cursor, *[p['group_id'] for p in photos_to_delete])
+            conn.commit()
 
             cursor.close(); conn.close()
             return jsonify({"message": "Photos deleted successfully"}), 200
@@ -338,19 +626,16 @@ def delete_photo():
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT file_name, user_id FROM photos WHERE id = %s", (photo_id,))
+        cursor.execute("SELECT file_name, user_id, group_id FROM photos WHERE id = %s", (photo_id,))
         photo = cursor.fetchone()
         if not photo:
             cursor.close(); conn.close(); return jsonify({"error": "Not found"}), 404
         if str(photo['user_id']) != str(user_id):
             cursor.close(); conn.close(); return jsonify({"error": "Unauthorized"}), 403
         cursor.execute("DELETE FROM photos WHERE id = %s", (photo_id,))
+        storage.release_reference(cursor, photo['file_name'])
+        gallery_cache.bump_group(cursor, photo['group_id'])
         conn.commit()
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        fp = os.path.join(upload_folder, photo['file_name'])
-        if os.path.exists(fp): os.remove(fp)
-        tp = os.path.join(upload_folder, f"thumb_{photo['file_name']}")
-        if os.path.exists(tp): os.remove(tp)
         cursor.close(); conn.close()
         return jsonify({"message": "Deleted"}), 200
     except Exception as e: return jsonify({"error": str(e)}), 500
@@ -392,6 +677,6 @@ def report_content():
         print(f"Report error: {e}")
         return jsonify({"error": str(e)}), 500
 
-@photos_bp.route('/uploads/<filename>')
+@photos_bp.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
\ No newline at end of file
+    return serve_upload(filename)
\ No newline at end of file
@@ -0,0 +1,264 @@
+import os
+import uuid
+from flask import Blueprint, request, jsonify, current_app
+from db import get_db_connection
+import storage
+import quotas
+import metrics
+from media import is_video_file
+from routes.photos import allowed_file, check_upload_allowed, register_upload
+
+uploads_bp = Blueprint('uploads', __name__)
+
+# =====================================================
+# RESUMABLE (CHUNKED) UPLOADS
+# =====================================================
+# 1. POST   /upload-sessions                      -> create session, returns session_id + chunk_size
+# 2. PUT    /upload-sessions/<id>/chunks/<index>  -> raw chunk bytes, written at `offset` (default index * chunk_size)
+# 3. GET    /upload-sessions/<id>                 -> committed offset (resume from here after a drop)
+# 4. POST   /upload-sessions/<id>/finalize        -> size/checksum check, then same logic as /upload-photo
+# Chunks are streamed straight into UPLOAD_FOLDER/.partial/<id>.part; the committed offset is the file size.
+
+CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', 500 * 1024 * 1024))
+SESSION_TTL_HOURS = int(os.getenv('UPLOAD_SESSION_TTL_HOURS', 24))
+STREAM_BUFFER = 64 * 1024
+
+def partial_path(session_id):
+    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], '.partial')
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    return os.path.join(folder, f"{session_id}.part")
+
+def committed_offset(session_id):
+    path = partial_path(session_id)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+def remove_partial(session_id):
+    path = partial_path(session_id)
+    if os.path.exists(path): os.remove(path)
+
+def get_session(cursor, session_id, user_id):
+    cursor.execute("SELECT * FROM upload_sessions WHERE id = %s AND user_id = %s", (session_id, user_id))
+    return cursor.fetchone()
+
+def purge_expired_sessions(cursor, conn):
+    cursor.execute("SELECT id FROM upload_sessions WHERE created_at < NOW() - INTERVAL %s HOUR", (SESSION_TTL_HOURS,))
+    expired = cursor.fetchall()
+    if expired:
+        for row in expired:
+            remove_partial(row['id'])
+        format_strings = ','.join(['%s'] * len(expired))
+        cursor.execute(f"DELETE FROM upload_sessions WHERE id IN ({format_strings})", tuple(r['id'] for r in expired))
+        conn.commit()
+
+# ==========================================
+# CREATE UPLOAD SESSION
+# ==========================================
+@uploads_bp.route('/upload-sessions', methods=['POST'])
+def create_upload_session():
+    data = request.json
+    user_id = data.get('user_id')
+    group_id = data.get('group_id')
+    file_name = data.get('file_name')
+    total_size = data.get('total_size')
+    checksum = data.get('sha256')
+
+    if not user_id or not group_id or not file_name or not total_size:
+        return jsonify({"error": "Missing fields"}), 400
+
+    if not allowed_file(file_name):
+        return jsonify({"error": "File type not allowed"}), 400
+
+    try:
+        total_size = int(total_size)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid total_size"}), 400
+
+    if total_size <= 0 or total_size > MAX_UPLOAD_SIZE:
+        return jsonify({"error": "File too large"}), 413
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        # Fail fast: no point in transferring 200 MB that will be rejected at the end.
+        # The quota slot itself is only reserved at finalize (abandoned sessions cost nothing).
+        error = check_upload_allowed(conn, cursor, user_id, group_id, is_video_file(file_name), reserve=False)
+        if error:
+            cursor.close(); conn.close()
+            return error
+
+        purge_expired_sessions(cursor, conn)
+
+        session_id = uuid.uuid4().hex
+        cursor.execute("""
+            INSERT INTO upload_sessions (id, user_id, group_id, file_name, total_size, checksum)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (session_id, user_id, group_id, file_name, total_size, checksum.lower() if checksum else None))
+        conn.commit()
+        cursor.close(); conn.close()
+
+        # Empty part file so the committed offset starts at 0
+        open(partial_path(session_id), 'wb').close()
+
+        return jsonify({"session_id": session_id, "chunk_size": CHUNK_SIZE, "offset": 0, "total_size": total_size}), 201
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# ==========================================
+# GET UPLOAD SESSION (COMMITTED OFFSET)
+# ==========================================
+@uploads_bp.route('/upload-sessions/<session_id>', methods=['GET'])
+def get_upload_session(session_id):
+    user_id = request.args.get('user_id')
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        session = get_session(cursor, session_id, user_id)
+        cursor.close(); conn.close()
+
+        if not session:
+            return jsonify({"error": "Upload session not found"}), 404
+
+        return jsonify({
+            "session_id": session_id,
+            "offset": committed_offset(session_id),
+            "total_size": session['total_size'],
+            "chunk_size": CHUNK_SIZE
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# ==========================================
+# UPLOAD CHUNK
+# ==========================================
+@uploads_bp.route('/upload-sessions/<session_id>/chunks/<int:index>', methods=['PUT'])
+def upload_chunk(session_id, index):
+    user_id = request.args.get('user_id')
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        offset = index * CHUNK_SIZE
+    if index < 0 or offset < 0:
+        return jsonify({"error": "index and offset must not be negative"}), 400
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        session = get_session(cursor, session_id, user_id)
+        cursor.close(); conn.close()
+
+        if not session:
+            return jsonify({"error": "Upload session not found"}), 404
+
+        current = committed_offset(session_id)
+        if offset > current:
+            # A chunk is missing: tell the client where to resume
+            return jsonify({"error": "Offset mismatch", "offset": current}), 409
+
+        length = request.content_length
+        if length is not None and offset + length > session['total_size']:
+            return jsonify({"error": "Chunk exceeds declared size", "offset": current}), 413
+
+        limit = min(CHUNK_SIZE, session['total_size'] - offset)
+        written = 0
+        with open(partial_path(session_id), 'r+b') as f:
+            # Re-sent chunk (e.g. after a dropped response): overwrite from its offset
+            f.seek(offset)
+            f.truncate()
+            while True:
+                buf = request.stream.read(STREAM_BUFFER)
+                if not buf:
+                    break
+                written += len(buf)
+                if written > limit:
+                    f.truncate(offset)
+                    return jsonify({"error": "Chunk too large", "offset": offset}), 413
+                f.write(buf)
+
+        metrics.UPLOAD_BYTES.inc(('chunk',), written)
+        return jsonify({"offset": offset + written, "total_size": session['total_size']}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# ==========================================
+# FINALIZE UPLOAD
+# ==========================================
+@uploads_bp.route('/upload-sessions/<session_id>/finalize', methods=['POST'])
+def finalize_upload(session_id):
+    data = request.json or {}
+    user_id = data.get('user_id')
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        session = get_session(cursor, session_id, user_id)
+
+        if not session:
+            cursor.close(); conn.close()
+            return jsonify({"error": "Upload session not found"}), 404
+
+        part = partial_path(session_id)
+        size = committed_offset(session_id)
+        if size != session['total_size']:
+            cursor.close(); conn.close()
+            return jsonify({"error": "Upload incomplete", "offset": size}), 409
+
+        # One pass over the file gives both the integrity check and the storage key
+        digest = storage.file_digest(part)
+        if session['checksum']:
+            if digest != session['checksum']:
+                # Corrupted transfer: start over
+                remove_partial(session_id)
+                cursor.execute("DELETE FROM upload_sessions WHERE id = %s", (session_id,))
+                conn.commit()
+                cursor.close(); conn.close()
+                return jsonify({"error": "Checksum mismatch"}), 422
+
+        group_id = session['group_id']
+        is_video = is_video_file(session['file_name'])
+
+        # Same membership / quota reservation as /upload-photo (state may have changed since the session started)
+        error = check_upload_allowed(conn, cursor, user_id, group_id, is_video)
+        if error:
+            cursor.close(); conn.close()
+            return error
+
+        try:
+            ext = session['file_name'].rsplit('.', 1)[1].lower()
+            filename, size = storage.import_file(current_app.config['UPLOAD_FOLDER'], part, ext, digest)
+
+            cursor.execute("DELETE FROM upload_sessions WHERE id = %s", (session_id,))
+            register_upload(conn, cursor, user_id, group_id, filename, size, is_video)
+        except Exception:
+            quotas.release_upload_quota(conn, cursor, user_id, is_video)
+            cursor.close(); conn.close()
+            raise
+
+        cursor.close(); conn.close()
+        return jsonify({"message": "File uploaded successfully", "filename": filename}), 201
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# ==========================================
+# ABORT UPLOAD
+# ==========================================
+@uploads_bp.route('/upload-sessions/<session_id>', methods=['DELETE'])
+def abort_upload(session_id):
+    user_id = request.args.get('user_id')
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        session = get_session(cursor, session_id, user_id)
+        if not session:
+            cursor.close(); conn.close()
+            return jsonify({"error": "Upload session not found"}), 404
+
+        cursor.execute("DELETE FROM upload_sessions WHERE id = %s", (session_id,))
+        conn.commit()
+        cursor.close(); conn.close()
+
+        remove_partial(session_id)
+        return jsonify({"message": "Upload cancelled"}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -14,6 +14,7 @@ CREATE TABLE groups_table (
     group_name VARCHAR(255) NOT NULL DEFAULT 'Adsız Grup',
     picture VARCHAR(255) DEFAULT NULL,
     is_joining_active TINYINT(1) DEFAULT 1,
+    gallery_version INT UNSIGNED NOT NULL DEFAULT 0,
     FOREIGN KEY (created_by) REFERENCES users(id)
 );
 
@@ -25,6 +26,11 @@ CREATE TABLE users(
     profile_image VARCHAR(255) DEFAULT NULL,
     phone_number VARCHAR(15) UNIQUE NOT NULL,
     is_super_admin TINYINT(1) DEFAULT 0,
+    plan VARCHAR(20) NOT NULL DEFAULT 'demo',
+    daily_photo_count INT NOT NULL DEFAULT 0,
+    daily_video_count INT NOT NULL DEFAULT 0,
+    last_upload_date DATE DEFAULT NULL,
+    visibility_version INT UNSIGNED NOT NULL DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     push_token VARCHAR(255) DEFAULT NULL;
 );
@@ -37,7 +43,8 @@ CREATE TABLE groups_members(
     is_admin TINYINT(1) NOT NULL DEFAULT 0,
     notifications TINYINT(1) NOT NULL DEFAULT 1,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE ON UPDATE CASCADE,
-    FOREIGN KEY (group_id) REFERENCES groups_table(id) ON DELETE CASCADE ON UPDATE CASCADE
+    FOREIGN KEY (group_id) REFERENCES groups_table(id) ON DELETE CASCADE ON UPDATE CASCADE,
+    KEY idx_groups_members_user_group (user_id, group_id)
 );
 
 CREATE TABLE photos (
@@ -46,8 +53,28 @@ CREATE TABLE photos (
     user_id INT NOT NULL,
     group_id INT NOT NULL,
     upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    processing_status ENUM('pending', 'processing', 'ready', 'failed') NOT NULL DEFAULT 'ready',
+    duration_ms INT DEFAULT NULL,
+    width INT DEFAULT NULL,
+    height INT DEFAULT NULL,
+    fps DECIMAL(7,3) DEFAULT NULL,
+    rotation SMALLINT NOT NULL DEFAULT 0,
+    video_codec VARCHAR(8) DEFAULT NULL,
+    sprite_frames TINYINT UNSIGNED NOT NULL DEFAULT 0,
+    phash BIGINT UNSIGNED DEFAULT NULL,
+    duplicate_of INT DEFAULT NULL,
+    taken_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    orientation TINYINT UNSIGNED DEFAULT NULL,
+    camera_make VARCHAR(64) DEFAULT NULL,
+    camera_model VARCHAR(64) DEFAULT NULL,
+    latitude DECIMAL(9,6) DEFAULT NULL,
+    longitude DECIMAL(9,6) DEFAULT NULL,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE ON UPDATE CASCADE,
-    FOREIGN KEY (group_id) REFERENCES groups_table(id) ON DELETE CASCADE ON UPDATE CASCADE
+    FOREIGN KEY (group_id) REFERENCES groups_table(id) ON DELETE CASCADE ON UPDATE CASCADE,
+    KEY idx_photos_group_date (group_id, upload_date, id),
+    KEY idx_photos_group_taken (group_id, taken_at, id),
+    KEY idx_photos_group_phash (group_id, phash),
+    KEY idx_photos_group_duplicate (group_id, duplicate_of)
 );
 
 CREATE TABLE hidden_photos (
@@ -97,6 +124,7 @@ CREATE TABLE blocked_users (
     blocked_id INT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE KEY unique_block (blocker_id, blocked_id),
+    KEY idx_blocked_users_blocked (blocked_id, blocker_id),
     FOREIGN KEY (blocker_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (blocked_id) REFERENCES users(id) ON DELETE CASCADE
 );
@@ -108,4 +136,49 @@ CREATE TABLE verification_codes (
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     expires_at DATETIME NOT NULL,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-);
\ No newline at end of file
+);
+
+CREATE TABLE media_jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    photo_id INT NOT NULL,
+    job_type VARCHAR(32) NOT NULL DEFAULT 'thumbnail',
+    status ENUM('pending', 'running', 'done', 'failed') NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    last_error VARCHAR(255) DEFAULT NULL,
+    run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    locked_at TIMESTAMP NULL DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (photo_id) REFERENCES photos(id) ON DELETE CASCADE,
+    KEY idx_media_jobs_status (status, run_after)
+);
+
+CREATE TABLE upload_sessions (
+    id CHAR(32) PRIMARY KEY,
+    user_id INT NOT NULL,
+    group_id INT NOT NULL,
+    file_name VARCHAR(255) NOT NULL,
+    total_size BIGINT NOT NULL,
+    checksum CHAR(64) DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (group_id) REFERENCES groups_table(id) ON DELETE CASCADE,
+    KEY idx_upload_sessions_created (created_at)
+);
+
+CREATE TABLE media_blobs (
+    storage_key VARCHAR(255) PRIMARY KEY,
+    ref_count INT NOT NULL DEFAULT 1,
+    size BIGINT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE file_tombstones (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    storage_key VARCHAR(255) NOT NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    last_error VARCHAR(255) DEFAULT NULL,
+    run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uniq_file_tombstones_key (storage_key),
+    KEY idx_file_tombstones_due (run_after)
+);
@@ -0,0 +1,248 @@
+import os
+import uuid
+import hashlib
+import threading
+from db import get_db_connection
+import media
+import metrics
+
+# =====================================================
+# CONTENT-ADDRESSED MEDIA STORAGE
+# =====================================================
+# Uploads are stored under their SHA-256: uploads/ab/cd/<sha256>.<ext>
+# The storage key ("ab/cd/<sha256>.<ext>") is what photos.file_name holds.
+# media_blobs counts how many photo rows point at a key, so identical media
+# shared to several groups is stored once and only removed with its last reference.
+# Removing the last reference writes a tombstone in the same transaction; the
+# FileCollector thread deletes the files (original + derivatives) later, in batches.
+
+HASH_BUFFER = 1024 * 1024
+TMP_DIR = '.tmp'
+
+def storage_key(digest, ext):
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{ext.lower()}"
+
+def _tmp_path(upload_folder):
+    folder = os.path.join(upload_folder, TMP_DIR)
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, uuid.uuid4().hex)
+
+def _commit_file(upload_folder, tmp_path, key):
+    dest = os.path.join(upload_folder, key)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    # Same key means same bytes, so replacing an existing copy is harmless
+    os.replace(tmp_path, dest)
+
+def save_stream(upload_folder, stream, ext):
+    """
+    Streams an upload to disk while hashing it (single pass) and moves it to its
+    content-addressed location. Returns (storage_key, size).
+    """
+    sha = hashlib.sha256()
+    size = 0
+    tmp_path = _tmp_path(upload_folder)
+    try:
+        with open(tmp_path, 'wb') as f:
+            for buf in iter(lambda: stream.read(HASH_BUFFER), b''):
+                sha.update(buf)
+                f.write(buf)
+                size += len(buf)
+        key = storage_key(sha.hexdigest(), ext)
+        _commit_file(upload_folder, tmp_path, key)
+        return key, size
+    except Exception:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+
+def import_file(upload_folder, path, ext, digest=None):
+    """Moves an already written file (e.g. a finished chunked upload) into storage. Returns (key, size)."""
+    size = os.path.getsize(path)
+    if digest is None:
+        digest = file_digest(path)
+    key = storage_key(digest, ext)
+    _commit_file(upload_folder, path, key)
+    return key, size
+
+def file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for buf in iter(lambda: f.read(HASH_BUFFER), b''):
+            sha.update(buf)
+    return sha.hexdigest()
+
+# ==========================================
+# REFERENCE COUNTING
+# ==========================================
+def add_reference(cursor, key, size):
+    """Counts one more photo row pointing at `key`. Runs in the caller's transaction."""
+    cursor.execute("""
+        INSERT INTO media_blobs (storage_key, ref_count, size) VALUES (%s, 1, %s)
+        ON DUPLICATE KEY UPDATE ref_count = ref_count + 1
+    """, (key, size))
+    # Same content uploaded again before the collector got to it
+    cursor.execute("DELETE FROM file_tombstones WHERE storage_key = %s", (key,))
+
+def add_references(cursor, items):
+    """add_reference() for a batch of (key, size), in one round trip per statement."""
+    cursor.executemany("""
+        INSERT INTO media_blobs (storage_key, ref_count, size) VALUES (%s, 1, %s)
+        ON DUPLICATE KEY UPDATE ref_count = ref_count + 1
+    """, items)
+    keys = tuple({key for key, _ in items})
+    cursor.execute(f"DELETE FROM file_tombstones WHERE storage_key IN ({','.join(['%s'] * len(keys))})", keys)
+
+def release_reference(cursor, key):
+    """
+    Drops one reference to `key`. When no photo uses the file anymore it is
+    tombstoned in the caller's transaction and removed by the collector after commit.
+    Files from before content addressing have no media_blobs row and are always released.
+    Returns True if the file was tombstoned.
+    """
+    cursor.execute("SELECT ref_count FROM media_blobs WHERE storage_key = %s FOR UPDATE", (key,))
+    row = cursor.fetchone()
+    if row:
+        ref_count = row['ref_count'] if isinstance(row, dict) else row[0]
+        if ref_count > 1:
+            cursor.execute("UPDATE media_blobs SET ref_count = ref_count - 1 WHERE storage_key = %s", (key,))
+            return False
+        cursor.execute("DELETE FROM media_blobs WHERE storage_key = %s", (key,))
+
+    cursor.execute("""
+        INSERT INTO file_tombstones (storage_key) VALUES (%s)
+        ON DUPLICATE KEY UPDATE created_at = CURRENT_TIMESTAMP, run_after = CURRENT_TIMESTAMP, attempts = 0
+    """, (key,))
+    return True
+
+def discard_files(conn, cursor, keys):
+    """
+    Files saved by an upload that failed before its photo rows were committed: rolls
+    back and tombstones them. The collector leaves any that another photo references.
+    """
+    try:
+        conn.rollback()
+        cursor.executemany("""
+            INSERT INTO file_tombstones (storage_key) VALUES (%s)
+            ON DUPLICATE KEY UPDATE created_at = CURRENT_TIMESTAMP, run_after = CURRENT_TIMESTAMP, attempts = 0
+        """, [(key,) for key in keys])
+        conn.commit()
+    except Exception as e:
+        print(f"Could not tombstone discarded uploads: {e}")
+
+def release_photos(cursor, where_sql, params):
+    """
+    Releases the files of every photo matching `where_sql`, before the rows go away
+    (directly or through ON DELETE CASCADE when a group or user is deleted).
+    """
+    cursor.execute(f"SELECT file_name FROM photos WHERE {where_sql}", params)
+    for row in cursor.fetchall():
+        release_reference(cursor, row['file_name'] if isinstance(row, dict) else row[0])
+
+# ==========================================
+# FILE GARBAGE COLLECTOR
+# ==========================================
+GC_BATCH_SIZE = int(os.getenv('FILE_GC_BATCH_SIZE', 200))
+GC_INTERVAL = float(os.getenv('FILE_GC_INTERVAL', 30))
+GC_GRACE = int(os.getenv('FILE_GC_GRACE', 60))  # Tombstones younger than this are left alone
+GC_MAX_ATTEMPTS = int(os.getenv('FILE_GC_MAX_ATTEMPTS', 5))
+
+_collector = None
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+def collect_batch(upload_folder, limit=GC_BATCH_SIZE):
+    """
+    Deletes the files of up to `limit` due tombstones. Idempotent: files already gone
+    are skipped and a tombstone is only dropped once its files are, so a run killed
+    midway is simply finished by the next one. Returns the number of tombstones handled.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT id, storage_key, attempts, UNIX_TIMESTAMP(created_at) AS created_ts
+            FROM file_tombstones
+            WHERE run_after <= NOW() AND created_at <= NOW() - INTERVAL %s SECOND AND attempts < %s
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (GC_GRACE, GC_MAX_ATTEMPTS, limit))
+        tombstones = cursor.fetchall()
+        if not tombstones:
+            conn.commit()
+            return 0
+
+        format_strings = ','.join(['%s'] * len(tombstones))
+        cursor.execute(f"SELECT storage_key FROM media_blobs WHERE storage_key IN ({format_strings})",
+                       tuple(t['storage_key'] for t in tombstones))
+        referenced = {row['storage_key'] for row in cursor.fetchall()}
+
+        done, deferred = [], []
+        for t in tombstones:
+            key = t['storage_key']
+            if key in referenced:
+                done.append(t['id'])
+                continue
+            original = os.path.join(upload_folder, key)
+            try:
+                # Written again after the tombstone: an upload of the same content is
+                # about to add its reference. Wait another grace period.
+                if os.path.exists(original) and os.path.getmtime(original) > float(t['created_ts']):
+                    deferred.append(t['id'])
+                    continue
+                removed = sum(_remove(path) for path in media.media_file_paths(upload_folder, key))
+                metrics.FILE_GC_FILES.inc(amount=removed)
+                done.append(t['id'])
+            except Exception as e:
+                print(f"File GC error for {key}: {e}")
+                cursor.execute("""
+                    UPDATE file_tombstones SET attempts = attempts + 1, last_error = %s,
+                           run_after = NOW() + INTERVAL %s SECOND
+                    WHERE id = %s
+                """, (str(e)[:255], 2 ** (t['attempts'] + 1) * GC_INTERVAL, t['id']))
+
+        if done:
+            cursor.execute(f"DELETE FROM file_tombstones WHERE id IN ({','.join(['%s'] * len(done))})", tuple(done))
+        if deferred:
+            cursor.execute(f"UPDATE file_tombstones SET created_at = NOW() WHERE id IN ({','.join(['%s'] * len(deferred))})",
+                           tuple(deferred))
+        conn.commit()
+        return len(tombstones)
+    finally:
+        cursor.close(); conn.close()
+
+class FileCollector(threading.Thread):
+    def __init__(self, upload_folder, interval=GC_INTERVAL, batch_size=GC_BATCH_SIZE):
+        super().__init__(name='file-collector', daemon=True)
+        self.upload_folder = upload_folder
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                handled = collect_batch(self.upload_folder, self.batch_size)
+            except Exception as e:
+                print(f"File GC error: {e}")
+                handled = 0
+
+            # A full batch means more is probably due right away
+            if handled < self.batch_size:
+                self._stop_event.wait(self.interval)
+
+
+def start_collector(upload_folder, **kwargs):
+    """Starts the in-process file collector (used by the development server)."""
+    global _collector
+    if _collector is None:
+        _collector = FileCollector(upload_folder, **kwargs)
+        _collector.start()
+    return _collector